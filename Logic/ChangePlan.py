@@ -0,0 +1,188 @@
+"""
+This module defines the change plan produced by the plan stage of every updater.
+A change plan is the minimal set of cell changes needed to bring TblSanctionsMap in line with the parsed sources.
+It can be saved to disk as JSON, reviewed, and applied later in a single transaction, provided that none of the cells
+it changes was modified since it was planned.
+
+A plan is applied set-based: the changes are loaded into a temporary staging table with fast_executemany,
+then reconciled with TblSanctionsMap by one MERGE per column family (the columns of one source).
+The number of round trips and the statement texts do not depend on the number of changed rows.
+"""
+
+# Import required libraries
+import re
+import json
+import datetime
+import logging
+from collections import namedtuple
+
+# A single cell change in TblSanctionsMap, keyed by the row's SanctionsMapId
+Change = namedtuple('Change', ['source', 'sanctions_map_id', 'country', 'column', 'old_value', 'new_value'])
+
+# Column names are interpolated into SQL, so only plain identifiers are accepted
+COLUMN_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_]+$')
+
+# Staging table of the changes being applied, private to the connection.
+# Values are staged as text and converted to the column type by the MERGE.
+STAGING_TABLE_SQL = """
+    IF OBJECT_ID('tempdb..#ChangePlan') IS NOT NULL
+        DROP TABLE #ChangePlan;
+    CREATE TABLE #ChangePlan (
+        SanctionsMapId INT NOT NULL,
+        ColumnName NVARCHAR(128) NOT NULL,
+        NewValue NVARCHAR(4000) NULL,
+        PRIMARY KEY (ColumnName, SanctionsMapId)
+    );
+"""
+
+
+# Compare a cell value with the value recorded in a plan, which went through JSON
+def same_value(current, recorded):
+    if current is None or recorded is None:
+        return current is recorded
+    return current == recorded or str(current) == str(recorded)
+
+
+# Read the current state of TblSanctionsMap as a list of dictionaries keyed by column name
+def load_snapshot(cursor):
+    cursor.execute("SELECT * FROM TblSanctionsMap")
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+# MERGE updating the given columns from the staged changes; a column without a staged change keeps its value.
+# Column names are validated identifiers, so they are written as literals and the statement text only depends on them.
+def merge_sql(columns):
+    names = ', '.join(f"N'{column}'" for column in columns)
+    pivot = ',\n                '.join(
+        f"MAX(CASE WHEN [ColumnName] = N'{column}' THEN 1 ELSE 0 END) AS [{column}__changed], "
+        f"MAX(CASE WHEN [ColumnName] = N'{column}' THEN [NewValue] END) AS [{column}]"
+        for column in columns
+    )
+    assignments = ',\n            '.join(
+        f"[{column}] = CASE WHEN s.[{column}__changed] = 1 THEN s.[{column}] ELSE m.[{column}] END"
+        for column in columns
+    )
+    return f"""
+        MERGE TblSanctionsMap AS m
+        USING (
+            SELECT [SanctionsMapId],
+                {pivot}
+            FROM #ChangePlan
+            WHERE [ColumnName] IN ({names})
+            GROUP BY [SanctionsMapId]
+        ) AS s
+        ON m.[SanctionsMapId] = s.[SanctionsMapId]
+        WHEN MATCHED THEN UPDATE SET
+            {assignments};
+    """
+
+
+class ChangePlan:
+
+    # Initialize the plan with an optional list of changes
+    def __init__(self, changes=None, created_at=None):
+        self.changes = list(changes or [])
+        self.created_at = created_at or datetime.datetime.now().isoformat(timespec='seconds')
+
+    def __len__(self):
+        return len(self.changes)
+
+    def __iter__(self):
+        return iter(self.changes)
+
+    # Add the changes of another plan to this one
+    def extend(self, other):
+        self.changes.extend(other.changes)
+
+    # Return the sub-plan holding only the changes of the given source
+    def for_source(self, source):
+        return ChangePlan([change for change in self.changes if change.source == source], self.created_at)
+
+    # Return the names of the sources present in the plan
+    def sources(self):
+        return sorted({change.source for change in self.changes})
+
+    # Log every change of the plan, grouped by source
+    def log_summary(self):
+        if not self.changes:
+            logging.info("Change plan is empty: the database is already up to date.")
+            return
+        for source in self.sources():
+            source_changes = [change for change in self.changes if change.source == source]
+            logging.info(f"{source}: {len(source_changes)} planned changes")
+            for change in source_changes:
+                logging.info(f"Country: {change.country}, Column: {change.column}, Change: {change.old_value} -> {change.new_value}")
+
+    # Log the YES/NO switches of the plan, the countries switched off first
+    def log_switches(self):
+        for old_value, new_value in (('YES', 'NO'), ('NO', 'YES')):
+            switches = [change for change in self.changes if change.old_value == old_value and change.new_value == new_value]
+            if switches:
+                logging.info(f"Countries switched from {old_value} to {new_value}:")
+                for change in switches:
+                    logging.info(f"Country: {change.country}, Column: {change.column}, Change: {old_value} -> {new_value}")
+
+    # Return the changes whose cell no longer holds the old value they were planned from, given the current table state
+    def stale_changes(self, snapshot):
+        rows = {row['SanctionsMapId']: row for row in snapshot}
+        return [change for change in self.changes
+                if change.sanctions_map_id not in rows
+                or not same_value(rows[change.sanctions_map_id].get(change.column), change.old_value)]
+
+    # Return the columns changed by each source, in a stable order
+    def column_families(self):
+        families = {}
+        for change in self.changes:
+            if not COLUMN_NAME_PATTERN.match(change.column):
+                raise ValueError(f"Invalid column name in change plan: {change.column}")
+            families.setdefault(change.source, set()).add(change.column)
+        return {source: sorted(columns) for source, columns in sorted(families.items())}
+
+    # Write the planned changes: stage them in one batch, then one MERGE per column family
+    def apply(self, cursor):
+        if not self.changes:
+            return
+        families = self.column_families()
+
+        # A later change of the same cell wins, as it would with one UPDATE per change
+        staged = {}
+        for change in self.changes:
+            new_value = None if change.new_value is None else str(change.new_value)
+            staged[(change.column, change.sanctions_map_id)] = new_value
+
+        cursor.execute(STAGING_TABLE_SQL)
+        cursor.fast_executemany = True
+        cursor.executemany(
+            "INSERT INTO #ChangePlan (ColumnName, SanctionsMapId, NewValue) VALUES (?, ?, ?)",
+            [(column, sanctions_map_id, new_value) for (column, sanctions_map_id), new_value in staged.items()],
+        )
+
+        for source, columns in families.items():
+            cursor.execute(merge_sql(columns))
+            logging.info(f"Applied {source} changes to {len(columns)} columns: {cursor.rowcount} rows updated.")
+        cursor.execute("DROP TABLE #ChangePlan")
+
+    # Serialize the plan to a JSON-compatible dictionary
+    def to_dict(self):
+        return {
+            'created_at': self.created_at,
+            'changes': [change._asdict() for change in self.changes],
+        }
+
+    # Build a plan from a dictionary produced by to_dict
+    @classmethod
+    def from_dict(cls, data):
+        return cls([Change(**change) for change in data.get('changes', [])], data.get('created_at'))
+
+    # Save the plan to a JSON file
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as plan_file:
+            json.dump(self.to_dict(), plan_file, ensure_ascii=False, indent=2)
+        logging.info(f"Change plan with {len(self.changes)} changes saved to: {path}")
+
+    # Load a plan from a JSON file
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as plan_file:
+            return cls.from_dict(json.load(plan_file))
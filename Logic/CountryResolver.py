@@ -0,0 +1,115 @@
+"""
+This module resolves the country names found in the sources to the rows of TblSanctionsMap.
+Names are normalized once (unidecode, upper case, plain quotes and single spaces) and the result is memoized, since the
+same few hundred names come back on every line of every source.
+
+The CountryResolver of a run indexes the English and French names of every table row, plus the known aliases of
+COUNTRY_ALIASES, which point to ISO-3166 alpha-3 codes. Every name resolves with one dictionary lookup to the
+SanctionsMapId of its row, which the updaters use as the join key instead of comparing strings.
+"""
+
+# Import required libraries
+import re
+import logging
+from functools import lru_cache
+from unidecode import unidecode
+
+# Columns of TblSanctionsMap holding country names, in resolution order
+NAME_COLUMNS = ['COUNTRY_NAME_ENG', 'COUNTRY_NAME_FR']
+
+# Column of TblSanctionsMap holding the ISO-3166 alpha-3 code
+ISO_CODE_COLUMN = 'COUNTRY_CODE_ISO_3'
+
+# Names used by the sources that differ from the table names, with the ISO-3166 alpha-3 code of their country
+COUNTRY_ALIASES = {
+    "DPRK": 'PRK',
+    "KOREA, NORTH": 'PRK',
+    "NORTH KOREA": 'PRK',
+    "DEMOCRATIC PEOPLE'S REPUBLIC OF KOREA": 'PRK',
+    "DEMOCRATIC PEOPLE'S REPUBLIC OF KOREA (DPRK)": 'PRK',
+    "DEMOCRATIC PEOPLE'S REPUBLIC OF KOREA (DPRK - NORTH KOREA)": 'PRK',
+    "BURMA": 'MMR',
+    "MYANMAR": 'MMR',
+    "MYANMAR (BURMA)": 'MMR',
+    "BOSNIA & HERZEGOVINA": 'BIH',
+    "BOSNIA AND HERZEGOVINA": 'BIH',
+    "COTE D'IVOIRE": 'CIV',
+    "IVORY COAST": 'CIV',
+    "RUSSIA": 'RUS',
+    "RUSSIAN FEDERATION": 'RUS',
+    "TURKIYE": 'TUR',
+    "TURKEY": 'TUR',
+    "ESWATINI": 'SWZ',
+    "SWAZILAND": 'SWZ',
+    "REPUBLIC OF GUINEA-BISSAU": 'GNB',
+    "GUINEA-BISSAU": 'GNB',
+    "IRAN": 'IRN',
+    "IRAN RELATING TO NUCLEAR WEAPONS": 'IRN',
+    "DEMOCRATIC REPUBLIC OF THE CONGO": 'COD',
+    "REPUBLIC DEMOCRATIC OF THE CONGO": 'COD',
+}
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+# Normalize a country name: transliterated, upper case, plain quotes and single spaces
+@lru_cache(maxsize=4096)
+def normalize_country_name(name):
+    if name is None:
+        return None
+    return WHITESPACE_PATTERN.sub(' ', unidecode(name.replace('’', "'")).upper()).strip()
+
+
+class CountryResolver:
+
+    # Index the names and ISO codes of the table rows, then the aliases
+    def __init__(self, rows):
+        self.names = {column: {} for column in NAME_COLUMNS}
+        self.aliases = {}
+        self.codes = {}
+        codes = {}
+
+        for row in rows:
+            for column in NAME_COLUMNS:
+                name = normalize_country_name(row.get(column))
+                if name:
+                    self.names[column].setdefault(name, row['SanctionsMapId'])
+            code = (row.get(ISO_CODE_COLUMN) or '').strip().upper()
+            if code:
+                codes.setdefault(code, []).append(row['SanctionsMapId'])
+
+        for code, ids in codes.items():
+            if len(ids) == 1:
+                self.codes[code] = ids[0]
+
+        for alias, code in COUNTRY_ALIASES.items():
+            if code in self.codes:
+                self.aliases[normalize_country_name(alias)] = self.codes[code]
+            elif code in codes:
+                logging.warning(f"Country alias {alias} ignored: {len(codes[code])} rows have the ISO code {code}.")
+
+    # Return the SanctionsMapId of a country name, or None if it is unknown.
+    # Names of the given column come first, then the aliases, then the names of the other columns.
+    def resolve(self, name, column='COUNTRY_NAME_ENG'):
+        name = normalize_country_name(name)
+        if not name:
+            return None
+        if name in self.names.get(column, {}):
+            return self.names[column][name]
+        if name in self.aliases:
+            return self.aliases[name]
+        for other_column in NAME_COLUMNS:
+            if name in self.names[other_column]:
+                return self.names[other_column][name]
+        return None
+
+    # Return the SanctionsMapId of an ISO-3166 alpha-3 code, or None if no single row has it
+    def resolve_code(self, code):
+        return self.codes.get((code or '').strip().upper())
+
+    # Return every normalized name and alias the resolver knows
+    def known_names(self):
+        known = set(self.aliases)
+        for names in self.names.values():
+            known.update(names)
+        return known
@@ -0,0 +1,154 @@
+"""
+This module provides the database access shared by the updaters of a run.
+The ConnectionPool hands out a bounded number of pyodbc connections and reuses them instead of reconnecting,
+and the RunContext, created once per run, owns the pool, the TblSanctionsMap snapshot read by every updater
+and the CountryResolver built from it.
+The pool counts the statements sent through its connections, so that a run reports its database round trips.
+"""
+
+# Import required libraries
+import queue
+import logging
+import threading
+import pyodbc
+from contextlib import contextmanager
+from Logic.ChangePlan import load_snapshot
+from Logic.CountryResolver import CountryResolver
+
+# Maximum number of connections open at the same time during a run
+DEFAULT_POOL_SIZE = 4
+
+
+class CountingCursor:
+
+    # Wrap a pyodbc cursor, adding every statement it sends to the counter
+    def __init__(self, cursor, counter):
+        object.__setattr__(self, 'cursor', cursor)
+        object.__setattr__(self, 'counter', counter)
+
+    def execute(self, *args, **kwargs):
+        self.counter.add()
+        return self.cursor.execute(*args, **kwargs)
+
+    # A batch sent with executemany counts as one statement
+    def executemany(self, *args, **kwargs):
+        self.counter.add()
+        return self.cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.cursor, name, value)
+
+
+class CountingConnection:
+
+    # Wrap a pyodbc connection so that its cursors count their statements
+    def __init__(self, cnx, counter):
+        self.cnx = cnx
+        self.counter = counter
+
+    def cursor(self):
+        return CountingCursor(self.cnx.cursor(), self.counter)
+
+    def __getattr__(self, name):
+        return getattr(self.cnx, name)
+
+
+class StatementCounter:
+
+    # Initialize a thread-safe statement counter
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def add(self):
+        with self.lock:
+            self.count += 1
+
+
+class ConnectionPool:
+
+    # Initialize the pool; connections are opened on first use, up to max_size
+    def __init__(self, conn_str, max_size=DEFAULT_POOL_SIZE):
+        self.conn_str = conn_str
+        self.max_size = max_size
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.statements = StatementCounter()
+
+    # Borrow a connection, waiting for a free one when max_size connections are in use.
+    # Uncommitted work is rolled back when the connection is returned; connections that failed are closed instead.
+    @contextmanager
+    def connection(self):
+        self.slots.acquire()
+        try:
+            try:
+                cnx = self.idle.get_nowait()
+            except queue.Empty:
+                cnx = CountingConnection(pyodbc.connect(self.conn_str), self.statements)
+                with self.lock:
+                    self.opened += 1
+
+            try:
+                yield cnx
+                cnx.rollback()
+            except Exception:
+                try:
+                    cnx.close()
+                except pyodbc.Error:
+                    pass
+                raise
+            self.idle.put(cnx)
+        finally:
+            self.slots.release()
+
+    # Close the idle connections; the pool opens new ones if it is used again
+    def close(self):
+        while True:
+            try:
+                cnx = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                cnx.close()
+            except pyodbc.Error as e:
+                logging.warning(f"Error closing database connection: {e}")
+        logging.info(f"Database pool closed, {self.opened} connections opened and {self.statements.count} statements sent during the run.")
+
+
+class RunContext:
+
+    # Initialize the context of a run with its connection pool
+    def __init__(self, conn_str, pool_size=DEFAULT_POOL_SIZE):
+        self.pool = ConnectionPool(conn_str, pool_size)
+        self.lock = threading.Lock()
+        self._snapshot = None
+        self._resolver = None
+
+    # Return the TblSanctionsMap snapshot of the run, read once on first use and shared by every updater.
+    # The rows must not be modified.
+    def snapshot(self):
+        with self.lock:
+            if self._snapshot is None:
+                with self.pool.connection() as cnx:
+                    cursor = cnx.cursor()
+                    self._snapshot = load_snapshot(cursor)
+                    cursor.close()
+                logging.info(f"Loaded TblSanctionsMap snapshot with {len(self._snapshot)} rows.")
+            return self._snapshot
+
+    # Return the country resolver of the run, built once from the snapshot
+    def country_resolver(self):
+        snapshot = self.snapshot()
+        with self.lock:
+            if self._resolver is None:
+                self._resolver = CountryResolver(snapshot)
+            return self._resolver
+
+    # Release the database resources of the run
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,140 @@
+"""
+This module keeps the OFAC SDN entities in the database, keyed by their SDN UID.
+TblOFACEntity holds one row per entity with the hash of its content, and TblOFACEntityCountry the SanctionsMapId
+of the countries each entity refers to.
+
+Every run compares the parsed entities with the stored hashes and only writes the entities added, amended or removed
+since the last ingested list. SDN.CSV and the advanced XML export give different content for the same entity (name
+order, remarks, countries from the remarks or from the addresses), so the first run after switching OFAC_MODE rewrites
+every entity. The US_OFAC_SANCTIONS flag is then derived from the entity countries with one set-based
+UPDATE, which only touches the rows whose flag changes.
+"""
+
+# Import required libraries
+import json
+import hashlib
+import logging
+import pyodbc
+from collections import namedtuple
+
+# An SDN entity as parsed from the list; programs and countries are sorted tuples, countries being SanctionsMapIds
+# once resolved
+SdnEntity = namedtuple('SdnEntity', ['uid', 'name', 'entity_type', 'programs', 'remarks', 'countries'])
+
+# Entities to insert, to update and to delete (UIDs), to bring the stored entities in line with the parsed list
+EntityDiff = namedtuple('EntityDiff', ['added', 'amended', 'removed'])
+
+# Created by the SchemaGuard before the first OFAC write, when missing
+CREATE_TABLES_SQL = """
+    IF OBJECT_ID('TblOFACEntity') IS NULL
+        CREATE TABLE TblOFACEntity (
+            Uid INT NOT NULL PRIMARY KEY,
+            Name NVARCHAR(350) NOT NULL,
+            EntityType NVARCHAR(50) NULL,
+            Programs NVARCHAR(400) NULL,
+            Remarks NVARCHAR(MAX) NULL,
+            ContentHash CHAR(64) NOT NULL,
+            UpdatedAt DATETIME NOT NULL DEFAULT GETDATE()
+        );
+    IF OBJECT_ID('TblOFACEntityCountry') IS NULL
+        CREATE TABLE TblOFACEntityCountry (
+            Uid INT NOT NULL,
+            SanctionsMapId INT NOT NULL,
+            PRIMARY KEY (Uid, SanctionsMapId)
+        );
+"""
+
+
+# Parameter types of the TblOFACEntity columns. fast_executemany otherwise sizes every parameter from the values of
+# the batch, which fails on the NVARCHAR(MAX) Remarks column; a size of 0 binds it as NVARCHAR(MAX)
+ENTITY_PARAMETER_TYPES = {
+    'Uid': (pyodbc.SQL_INTEGER, 0, 0),
+    'Name': (pyodbc.SQL_WVARCHAR, 350, 0),
+    'EntityType': (pyodbc.SQL_WVARCHAR, 50, 0),
+    'Programs': (pyodbc.SQL_WVARCHAR, 400, 0),
+    'Remarks': (pyodbc.SQL_WVARCHAR, 0, 0),
+    'ContentHash': (pyodbc.SQL_VARCHAR, 64, 0),
+}
+
+
+# Return the parameter types of a statement binding the given TblOFACEntity columns, in order
+def entity_parameter_types(*columns):
+    return [ENTITY_PARAMETER_TYPES[column] for column in columns]
+
+
+# Hash the stored content of an entity, so that amendments are detected without reading the entities back
+def entity_hash(entity):
+    return hashlib.sha256(json.dumps(entity, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+# Read the content hash of every stored entity, keyed by UID; empty before the first ingestion
+def load_entity_hashes(cursor):
+    cursor.execute("SELECT OBJECT_ID('TblOFACEntity')")
+    if cursor.fetchone()[0] is None:
+        return {}
+    cursor.execute("SELECT [Uid], [ContentHash] FROM TblOFACEntity")
+    return {uid: content_hash for uid, content_hash in cursor.fetchall()}
+
+
+# Compare the parsed entities ({uid: SdnEntity}) with the stored hashes
+def diff_entities(entities, stored_hashes):
+    added = []
+    amended = []
+    for uid, entity in sorted(entities.items()):
+        if uid not in stored_hashes:
+            added.append(entity)
+        elif stored_hashes[uid] != entity_hash(entity):
+            amended.append(entity)
+    removed = sorted(set(stored_hashes) - set(entities))
+    return EntityDiff(added, amended, removed)
+
+
+# Write an entity diff, with one batched statement per kind of change
+def apply_entity_diff(cursor, diff):
+    cursor.fast_executemany = True
+
+    # Amended entities get their countries rewritten, removed ones lose them
+    stale_uids = [(entity.uid,) for entity in diff.amended] + [(uid,) for uid in diff.removed]
+    if stale_uids:
+        cursor.executemany("DELETE FROM TblOFACEntityCountry WHERE [Uid] = ?", stale_uids)
+    if diff.removed:
+        cursor.executemany("DELETE FROM TblOFACEntity WHERE [Uid] = ?", [(uid,) for uid in diff.removed])
+
+    if diff.amended:
+        cursor.setinputsizes(entity_parameter_types('Name', 'EntityType', 'Programs', 'Remarks', 'ContentHash', 'Uid'))
+        cursor.executemany("""
+            UPDATE TblOFACEntity
+            SET [Name] = ?, [EntityType] = ?, [Programs] = ?, [Remarks] = ?, [ContentHash] = ?, [UpdatedAt] = GETDATE()
+            WHERE [Uid] = ?
+        """, [(entity.name, entity.entity_type, '; '.join(entity.programs), entity.remarks, entity_hash(entity), entity.uid)
+              for entity in diff.amended])
+    if diff.added:
+        cursor.setinputsizes(entity_parameter_types('Uid', 'Name', 'EntityType', 'Programs', 'Remarks', 'ContentHash'))
+        cursor.executemany("""
+            INSERT INTO TblOFACEntity ([Uid], [Name], [EntityType], [Programs], [Remarks], [ContentHash])
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(entity.uid, entity.name, entity.entity_type, '; '.join(entity.programs), entity.remarks, entity_hash(entity))
+              for entity in diff.added])
+    cursor.setinputsizes(None)
+
+    country_rows = [(entity.uid, country) for entity in diff.added + diff.amended for country in entity.countries]
+    if country_rows:
+        cursor.executemany("INSERT INTO TblOFACEntityCountry ([Uid], [SanctionsMapId]) VALUES (?, ?)", country_rows)
+
+    logging.info(f"OFAC entities: {len(diff.added)} added, {len(diff.amended)} amended, {len(diff.removed)} removed.")
+
+
+# Derive a TblSanctionsMap flag from the entity countries in one statement, writing only the rows whose flag changes
+def refresh_country_flag(cursor, column):
+    cursor.execute(f"""
+        UPDATE m
+        SET [{column}] = f.Flag
+        FROM TblSanctionsMap m
+        CROSS APPLY (
+            SELECT CASE WHEN EXISTS (
+                SELECT 1 FROM TblOFACEntityCountry c WHERE c.[SanctionsMapId] = m.[SanctionsMapId]
+            ) THEN 'YES' ELSE 'NO' END AS Flag
+        ) f
+        WHERE m.[{column}] IS NULL OR m.[{column}] <> f.Flag
+    """)
+    logging.info(f"{column} derived from the OFAC entities: {cursor.rowcount} rows changed.")
@@ -0,0 +1,98 @@
+"""
+This module provides the HTML parsing layer shared by every parser.
+Pages are parsed with the fastest BeautifulSoup tree builder installed: lxml when available, else the pure-Python
+html.parser shipped with Python. HTML_PARSER forces a given builder.
+
+Each parser only reads one table, section or list of a page, so it passes a SoupStrainer describing that subtree:
+the tags outside it are never built, which makes the tree, and every search in it, much smaller.
+
+Run with --benchmark [DIR] to time every parser on saved pages (DIR/<source>.html, e.g. DIR/CPI.html; by default the
+pages of fixtures/html), comparing a full html.parser tree with the builder and strainer used by the parser.
+"""
+
+# Import required libraries
+import os
+import sys
+import time
+import logging
+import importlib
+from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+
+# Tree builders tried in order; lxml is a C parser, html.parser the pure-Python fallback
+PREFERRED_BUILDERS = ['lxml', 'html.parser']
+
+# Parser modules timed by the benchmark, with the strainer of the page they parse
+BENCHMARKED_PARSERS = {
+    'CPI': 'Parser.CPI',
+    'EUFATF': 'Parser.EUFATF',
+    'EUtax': 'Parser.EUtax',
+    'FATF_CFA': 'Parser.FATF_CFA',
+    'FATF_IM': 'Parser.FATF_IM',
+    'FRsanctions': 'Parser.FRsanctions',
+    'FRtax': 'Parser.FRtax',
+    'UKsanctions': 'Parser.UKsanctions',
+}
+
+# Saved pages timed by the benchmark when no directory is given
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures', 'html')
+
+# Number of times each page is parsed by the benchmark
+BENCHMARK_REPEAT = 20
+
+_builder = None
+
+
+# Return the name of the tree builder used for every page, chosen once
+def html_builder():
+    global _builder
+    if _builder is None:
+        forced = os.getenv('HTML_PARSER')
+        if forced:
+            _builder = forced
+        else:
+            _builder = next(name for name in PREFERRED_BUILDERS if builder_registry.lookup(name) is not None)
+        logging.info(f"HTML pages are parsed with {_builder}.")
+    return _builder
+
+
+# Parse a page, building only the tags matched by parse_only when it is given
+def parse_html(content, parse_only=None):
+    return BeautifulSoup(content, html_builder(), parse_only=parse_only)
+
+
+# Return the mean time in milliseconds taken to parse a page
+def time_parse(content, builder, parse_only=None, repeat=BENCHMARK_REPEAT):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        BeautifulSoup(content, builder, parse_only=parse_only)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+# Time every parser on its saved page, with a full html.parser tree and with its own builder and strainer
+def benchmark(fixture_dir=FIXTURE_DIR):
+    for source, module_name in BENCHMARKED_PARSERS.items():
+        path = os.path.join(fixture_dir, f"{source}.html")
+        if not os.path.exists(path):
+            logging.info(f"{source}: no saved page at {path}, skipped.")
+            continue
+        with open(path, 'rb') as fixture_file:
+            content = fixture_file.read()
+
+        parse_only = importlib.import_module(module_name).PARSE_ONLY
+        full_ms = time_parse(content, 'html.parser')
+        strained_ms = time_parse(content, html_builder(), parse_only)
+        logging.info(f"{source}: {len(content) / 1024:.0f} KiB page parsed in {full_ms:.1f} ms with a full html.parser tree, "
+                     f"{strained_ms:.1f} ms with {html_builder()} and its strainer ({full_ms / strained_ms:.1f}x faster).")
+
+
+def main():
+    if len(sys.argv) in (2, 3) and sys.argv[1] == '--benchmark':
+        benchmark(*sys.argv[2:])
+    else:
+        print("Usage: python -m Logic.HtmlParser --benchmark [DIR]")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,296 @@
+"""
+This module provides the on-disk HTTP cache shared by every parser, on top of the shared HTTP session.
+Each download is sent as a conditional GET (If-None-Match / If-Modified-Since) when the URL was seen before,
+and response bodies are stored once under their SHA-256, so a 304 answer is served from disk.
+
+The cache also remembers, for each source, the hash of every document behind its last applied run.
+An updater whose documents all hash the same as that fingerprint is unchanged, and its parse and plan stages are skipped.
+
+Large documents can be streamed instead: stream() returns the body as chunks, hashed and stored on disk as they are read,
+so the caller parses while downloading and never holds the whole body in memory.
+
+Every request is sent through the request scheduler (Logic/RequestScheduler.py), which paces each host.
+The index of cached URLs is updated in memory and written by flush(), once the documents of a run have been fetched.
+"""
+
+# Import required libraries
+import io
+import os
+import json
+import hashlib
+import datetime
+import logging
+import threading
+import requests
+from Logic.HttpClient import get_session
+from Logic.RequestScheduler import get_scheduler
+
+# Directory of the cache, relative to the working directory unless HTTP_CACHE_DIR is set
+DEFAULT_CACHE_DIR = '.http_cache'
+
+# Size of the chunks read from streamed responses and stored bodies
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class CachedResponse:
+
+    # Initialize the response with the fields the parsers read
+    def __init__(self, url, status_code, content, sha256=None, not_modified=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.sha256 = sha256
+        self.not_modified = not_modified
+
+    # Raise the same exception as requests for error status codes
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+
+class ChunkReader(io.RawIOBase):
+
+    # Wrap an iterator of byte chunks into a readable binary stream
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    # Fill the buffer from the pending chunk, pulling the next chunk when it is exhausted
+    def readinto(self, buffer):
+        while not self.pending:
+            self.pending = next(self.chunks, None)
+            if self.pending is None:
+                self.pending = b''
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+class CachedStream:
+
+    # Initialize the stream with the fields the parsers read; sha256 is only known upfront when served from disk
+    def __init__(self, url, status_code, chunks, sha256=None, not_modified=False):
+        self.url = url
+        self.status_code = status_code
+        self.chunks = chunks
+        self.sha256 = sha256
+        self.not_modified = not_modified
+
+    # Raise the same exception as requests for error status codes
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+    # Return the body as a binary file object, suitable for xml.etree.ElementTree.iterparse
+    def raw(self):
+        return io.BufferedReader(ChunkReader(self.chunks))
+
+    # Return the body as a text file object decoded incrementally, suitable for csv.reader
+    def text(self, encoding='utf-8'):
+        return io.TextIOWrapper(self.raw(), encoding=encoding, newline='')
+
+
+class HttpCache:
+
+    # Initialize the cache and load its index
+    def __init__(self, directory=None):
+        self.directory = directory or os.getenv('HTTP_CACHE_DIR') or DEFAULT_CACHE_DIR
+        self.index_path = os.path.join(self.directory, 'index.json')
+        self.lock = threading.Lock()
+        self.index = self.load_index()
+        self.dirty = False
+
+    # Load the index of cached URLs and applied fingerprints, starting empty if it is missing or unreadable
+    def load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as index_file:
+                index = json.load(index_file)
+        except FileNotFoundError:
+            index = {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"HTTP cache index unreadable, starting with an empty cache: {e}")
+            index = {}
+        index.setdefault('urls', {})
+        index.setdefault('sources', {})
+        return index
+
+    # Write the index atomically; the caller holds the lock
+    def save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as index_file:
+            json.dump(self.index, index_file, indent=2)
+        os.replace(temp_path, self.index_path)
+        self.dirty = False
+
+    # Record the entry of a downloaded URL in memory; the caller holds the lock
+    def record_url(self, url, sha256, response):
+        self.index['urls'][url] = {
+            'sha256': sha256,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+        self.dirty = True
+
+    # Write the index if a URL was recorded since it was last written
+    def flush(self):
+        with self.lock:
+            if self.dirty:
+                self.save_index()
+
+    # Path of a body stored under its SHA-256
+    def body_path(self, sha256):
+        return os.path.join(self.directory, 'bodies', sha256[:2], sha256)
+
+    # Read a stored body, or None if it was removed
+    def read_body(self, sha256):
+        try:
+            with open(self.body_path(sha256), 'rb') as body_file:
+                return body_file.read()
+        except OSError:
+            return None
+
+    # Store a body under its SHA-256, once
+    def write_body(self, sha256, content):
+        path = self.body_path(sha256)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as body_file:
+            body_file.write(content)
+        os.replace(temp_path, path)
+
+    # Download a URL with a conditional GET, serving the stored body when the server answers 304
+    def get(self, url, session=None, **kwargs):
+        with self.lock:
+            entry = dict(self.index['urls'].get(url, {}))
+        cached_content = self.read_body(entry['sha256']) if entry.get('sha256') else None
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if cached_content is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = get_scheduler().send(url, lambda: (session or get_session()).get(url, headers=headers, **kwargs))
+
+        if response.status_code == 304 and cached_content is not None:
+            logging.info(f"Not modified, served from cache: {url}")
+            return CachedResponse(url, 200, cached_content, entry['sha256'], not_modified=True)
+        if response.status_code != 200:
+            return CachedResponse(url, response.status_code, response.content)
+
+        sha256 = hashlib.sha256(response.content).hexdigest()
+        self.write_body(sha256, response.content)
+        with self.lock:
+            self.record_url(url, sha256, response)
+        return CachedResponse(url, 200, response.content, sha256, not_modified=sha256 == entry.get('sha256'))
+
+    # Yield the chunks of a stored body
+    def read_body_chunks(self, sha256):
+        with open(self.body_path(sha256), 'rb') as body_file:
+            while True:
+                chunk = body_file.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    # Yield the chunks of a response while hashing and storing them; the body is recorded once fully read
+    def store_chunks(self, url, response, on_complete):
+        hasher = hashlib.sha256()
+        os.makedirs(os.path.join(self.directory, 'bodies'), exist_ok=True)
+        temp_path = os.path.join(self.directory, 'bodies', f"stream.{threading.get_ident()}.tmp")
+        completed = False
+        try:
+            with open(temp_path, 'wb') as body_file:
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    hasher.update(chunk)
+                    body_file.write(chunk)
+                    yield chunk
+
+            sha256 = hasher.hexdigest()
+            path = self.body_path(sha256)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+            with self.lock:
+                self.record_url(url, sha256, response)
+            completed = True
+            if on_complete:
+                on_complete(sha256)
+        finally:
+            response.close()
+            if not completed and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    # Stream a URL with a conditional GET; on_complete receives the body hash once the body has been read
+    def stream(self, url, session=None, on_complete=None, **kwargs):
+        with self.lock:
+            entry = dict(self.index['urls'].get(url, {}))
+        cached = bool(entry.get('sha256')) and os.path.exists(self.body_path(entry['sha256']))
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if cached:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = get_scheduler().send(url, lambda: (session or get_session()).get(url, headers=headers, stream=True, **kwargs),
+                                        stream=True)
+
+        if response.status_code == 304 and cached:
+            response.close()
+            logging.info(f"Not modified, streamed from cache: {url}")
+            return CachedStream(url, 200, self.read_body_chunks(entry['sha256']), entry['sha256'], not_modified=True)
+        if response.status_code != 200:
+            content = response.content
+            response.close()
+            return CachedStream(url, response.status_code, iter([content]))
+
+        return CachedStream(url, 200, self.store_chunks(url, response, on_complete))
+
+    # Return the fingerprint ({url: sha256}) of the documents behind the last applied run of a source
+    def applied_fingerprint(self, source):
+        with self.lock:
+            return dict(self.index['sources'].get(source, {}))
+
+    # Record the fingerprint of the documents a source was last applied from
+    def mark_applied(self, source, fingerprint):
+        with self.lock:
+            self.index['sources'][source] = dict(fingerprint)
+            self.save_index()
+
+    # Remove the stored bodies no longer referenced by any URL
+    def prune(self):
+        with self.lock:
+            referenced = {entry.get('sha256') for entry in self.index['urls'].values()}
+        bodies_dir = os.path.join(self.directory, 'bodies')
+        removed = 0
+        for root, _, files in os.walk(bodies_dir):
+            for name in files:
+                if name not in referenced:
+                    os.remove(os.path.join(root, name))
+                    removed += 1
+        if removed:
+            logging.info(f"Removed {removed} stale bodies from the HTTP cache.")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# Return the cache shared by every parser of the process
+def get_http_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
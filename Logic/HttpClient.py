@@ -0,0 +1,72 @@
+"""
+This module provides the HTTP session shared by every parser.
+A single requests.Session keeps one connection pool per host, so the TCP and TLS setup cost is paid once per host
+instead of once per request, and connections are reused across updaters and threads.
+Every request gets gzip/deflate compression, retries with exponential backoff on transient errors,
+and connect/read timeouts unless the caller passes its own.
+Throttling answers (429, 503) are not retried here but by the request scheduler, which slows down the whole host.
+"""
+
+# Import required libraries
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Seconds to wait for the connection, and between two bytes of the response
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+
+# Number of hosts kept in the pool, and connections kept per host (at least the scheduler's MAX_CONCURRENCY)
+POOL_CONNECTIONS = 20
+POOL_MAXSIZE = 20
+
+# Retries on connection errors and transient status codes; the last response is returned instead of raising.
+# Retry-After is left to the request scheduler, so that a throttled host is held back for every thread.
+RETRY = Retry(
+    total=5,
+    connect=5,
+    read=5,
+    backoff_factor=0.5,
+    status_forcelist=(500, 502, 504),
+    allowed_methods=('GET', 'HEAD'),
+    respect_retry_after_header=False,
+    raise_on_status=False,
+)
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'SanctionsPipeline/1.0 (+https://github.com/KarDjen/Sanctions)',
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+
+    # Apply the default timeouts to every request that does not set its own
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = (CONNECT_TIMEOUT, READ_TIMEOUT)
+        return super().send(request, **kwargs)
+
+
+# Build a session with pooled, retrying and time-limited connections
+def create_session():
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    adapter = TimeoutHTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=RETRY)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# Return the session shared by every parser of the process
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
@@ -0,0 +1,200 @@
+"""
+This module schedules the HTTP requests of every parser, host by host, so that each source is downloaded as fast as
+its host allows without getting the pipeline throttled.
+
+Every host gets a token bucket limiting its request rate, and a concurrency limit adapted to its answers (AIMD):
+the limit grows by one after a full window of successful answers, and is halved when the host answers 429 or 503,
+fails to answer, or answers slower than SLOW_RESPONSE_SECONDS.
+A throttled request is sent again after the delay of its Retry-After header, which holds back every request to the
+host whichever thread or parser sends it, or, without that header, after an exponential backoff of its own.
+A streamed request keeps its slot until its response is closed, so that the body download counts against the host.
+"""
+
+# Import required libraries
+import time
+import logging
+import datetime
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# Requests sent to one host per second on average, and the burst allowed above that rate
+REQUESTS_PER_SECOND = 10.0
+BUCKET_SIZE = 10
+
+# Requests in flight to one host: at the start, and the bounds of the adaptive limit
+INITIAL_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 16
+
+# Answers meaning the host is overloaded; they halve the concurrency limit and the request is sent again
+THROTTLE_STATUS_CODES = (429, 503)
+
+# Answers slower than this also halve the concurrency limit
+SLOW_RESPONSE_SECONDS = 10.0
+
+# Time during which the limit is not halved again, so that the requests already in flight do not collapse it to one
+DECREASE_COOLDOWN_SECONDS = 5.0
+
+# Retries of a throttled request, the backoff when the host gives no Retry-After, and the longest delay honoured
+MAX_THROTTLE_RETRIES = 5
+BACKOFF_SECONDS = 1.0
+MAX_RETRY_AFTER_SECONDS = 300.0
+
+
+# Return the delay in seconds requested by the Retry-After header of a response, or None if it has none
+def retry_after(response):
+    value = (response.headers.get('Retry-After') or '').strip()
+    if not value:
+        return None
+    if value.isdigit():
+        return min(float(value), MAX_RETRY_AFTER_SECONDS)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    delay = (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+    return min(max(delay, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+
+class HostLimiter:
+
+    # Initialize the limiter of a host with a full bucket and the initial concurrency limit
+    def __init__(self, host):
+        self.host = host
+        self.condition = threading.Condition()
+        self.limit = INITIAL_CONCURRENCY
+        self.in_flight = 0
+        self.tokens = float(BUCKET_SIZE)
+        self.refilled_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.successes = 0
+        self.decreased_at = 0.0
+
+    # Add the tokens earned since the last refill; the caller holds the condition
+    def refill(self, now):
+        self.tokens = min(float(BUCKET_SIZE), self.tokens + (now - self.refilled_at) * REQUESTS_PER_SECOND)
+        self.refilled_at = now
+
+    # Wait for the end of any Retry-After delay, a free slot and a token, then take the slot and the token
+    def acquire(self):
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self.refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.in_flight >= self.limit:
+                    wait = None
+                elif self.tokens < 1:
+                    wait = (1 - self.tokens) / REQUESTS_PER_SECOND
+                else:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+                self.condition.wait(wait)
+
+    # Release the slot and adapt the concurrency limit; status_code is None when the host did not answer
+    def release(self, status_code, latency):
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if status_code is None or status_code in THROTTLE_STATUS_CODES or latency > SLOW_RESPONSE_SECONDS:
+                if now - self.decreased_at >= DECREASE_COOLDOWN_SECONDS and self.limit > MIN_CONCURRENCY:
+                    self.limit = max(MIN_CONCURRENCY, self.limit // 2)
+                    logging.info(f"{self.host}: concurrency lowered to {self.limit} "
+                                 f"(status {status_code}, {latency:.1f}s).")
+                self.decreased_at = now
+                self.successes = 0
+            elif status_code < 500:
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < MAX_CONCURRENCY:
+                    self.limit += 1
+                    self.successes = 0
+            self.condition.notify_all()
+
+    # Hold back every request to the host for the given delay
+    def block(self, delay):
+        with self.condition:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+
+# Release the slot of a streamed request once its response is closed, however many times close is called
+def release_on_close(response, limiter, status_code, latency):
+    close = response.close
+    released = threading.Event()
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            if not released.is_set():
+                released.set()
+                limiter.release(status_code, latency)
+
+    response.close = close_and_release
+
+
+class RequestScheduler:
+
+    # Initialize the scheduler without any host
+    def __init__(self):
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    # Return the limiter of the host of a URL, created on first use
+    def host_limiter(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostLimiter(host)
+            return self.hosts[host]
+
+    # Send a request (a callable returning a response) through the limiter of the host of its URL.
+    # A throttled request is sent again once the Retry-After delay of the host or its own backoff is over;
+    # the last answer is returned. With stream, the slot of the last answer is only released when it is closed,
+    # the concurrency limit being adapted to the time taken by its headers.
+    def send(self, url, request, stream=False):
+        limiter = self.host_limiter(url)
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            limiter.acquire()
+            start = time.monotonic()
+            try:
+                response = request()
+            except Exception:
+                limiter.release(None, time.monotonic() - start)
+                raise
+            status_code = response.status_code
+            latency = time.monotonic() - start
+
+            last = status_code not in THROTTLE_STATUS_CODES or attempt == MAX_THROTTLE_RETRIES
+            if stream and last:
+                release_on_close(response, limiter, status_code, latency)
+                return response
+            limiter.release(status_code, latency)
+            if last:
+                return response
+            delay = retry_after(response)
+            response.close()
+            if delay is None:
+                delay = BACKOFF_SECONDS * 2 ** attempt
+                logging.warning(f"{limiter.host} answered {status_code} for {url}, sending it again in {delay:.1f}s.")
+                time.sleep(delay)
+            else:
+                logging.warning(f"{limiter.host} answered {status_code} with Retry-After, holding the host for {delay:.1f}s.")
+                limiter.block(delay)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+# Return the scheduler shared by every parser of the process
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
@@ -0,0 +1,163 @@
+"""
+This module classifies every country of TblSanctionsMap into LEVEL_OF_RISK, LEVEL_OF_VIGILANCE and LIST.
+The decision table is written once: each rule gives the three outputs together, and the first matching rule wins,
+exactly like the CASE expressions of Logic.ComputedLogic that it replaces.
+The outputs are stored in ordinary columns, refreshed after every run, so reading the table no longer evaluates any rule
+and changing a rule no longer needs DDL.
+
+The rules follow the SQL Server semantics of the former computed columns:
+a NULL cell never matches 'YES' nor 'NO', and text comparisons ignore case and trailing spaces.
+"""
+
+# Import required libraries
+import re
+import logging
+from collections import namedtuple
+from Logic.ChangePlan import Change, ChangePlan, load_snapshot
+from Logic.ComputedLogic import get_sanctions_map_columns_sql
+
+# Columns written by the engine, in output order
+CLASSIFICATION_COLUMNS = ['LEVEL_OF_RISK', 'LEVEL_OF_VIGILANCE', 'LIST']
+
+# SQL type of the classification columns
+CLASSIFICATION_COLUMN_TYPE = 'NVARCHAR(255)'
+
+# Source name of the classification changes in change plans and in the logs
+SOURCE = 'RiskEngine'
+
+CALL_FOR_ACTION_COLUMN = 'FATF_HIGH_RISK_JURISDICTIONS_SUBJECT_TO_A_CALL_FOR_ACTION'
+
+# AML and non-cooperative tax jurisdiction lists
+AML_LIST_COLUMNS = [
+    'EU_AML_HIGH_RISK_COUNTRIES',
+    'FATF_JURISDICTIONS_UNDER_INCREASED_MONITORING',
+    'EU_LIST_OF_NON_COOPERATIVE_JURISDICTIONS',
+    'FR_LIST_OF_NON_COOPERATIVE_JURISDICTIONS',
+]
+
+# French and European sanctions
+SANCTIONS_COLUMNS = [
+    'FR_SECTORAL_EMBARGO',
+    'FR_MILITARY_EMBARGO',
+    'FR_INTERNAL_REPRESSION_EQUIPMENT',
+    'FR_INTERNAL_REPRESSION',
+    'FR_SECTORAL_RESTRICTIONS',
+    'FR_FINANCIAL_RESTRICTIONS',
+    'FR_TRAVEL_BANS',
+    'EU_ASSET_FREEZE_AND_PROHIBITION_TO_MAKE_FUNDS_AVAILABLE',
+    'EU_INVESTMENTS',
+    'FR_ASSET_FREEEZE',
+    'EU_FINANCIAL_MEASURES',
+]
+
+# A rule matches when (any column of any_yes is 'YES' or the country is one of countries),
+# every column of all_no is 'NO' and the CPI score is at least min_cpi_score.
+# Empty conditions always hold.
+Rule = namedtuple('Rule', ['name', 'any_yes', 'countries', 'all_no', 'min_cpi_score', 'outputs'])
+
+# Decision table, evaluated top to bottom; outputs are (LEVEL_OF_RISK, LEVEL_OF_VIGILANCE, LIST)
+DECISION_TABLE = [
+    Rule('FATF call for action or Cuba', [CALL_FOR_ACTION_COLUMN], ['CUBA'], [], None,
+         ('PROHIBITED', 'PROHIBITED', 'PROHIBITED')),
+    Rule('AML or tax list', AML_LIST_COLUMNS, [], [CALL_FOR_ACTION_COLUMN], None,
+         ('HIGH', 'ENHANCED', 'RED')),
+    Rule('FR or EU sanctions', SANCTIONS_COLUMNS, [], AML_LIST_COLUMNS + ['UK_FINANCIAL_SANCTIONS'], None,
+         ('HIGH', 'ENHANCED', 'RED')),
+    Rule('CPI score of 50 or more', [], [], [], 50,
+         ('STANDARD', 'STANDARD', 'GREEN')),
+    Rule('UK or US sanctions only', ['UK_FINANCIAL_SANCTIONS', 'US_OFAC_SANCTIONS'], [], SANCTIONS_COLUMNS + AML_LIST_COLUMNS, None,
+         ('STANDARD', 'ENHANCED UK/US', 'GREEN')),
+]
+
+# Outputs of the countries matching no rule
+DEFAULT_OUTPUTS = ('MEDIUM', 'ENHANCED', 'AMBER')
+
+
+# Compare a cell with a text literal the way SQL Server does: NULL never matches, case and trailing spaces are ignored
+def sql_equals(value, literal):
+    if value is None:
+        return False
+    return str(value).rstrip().upper() == literal
+
+
+# Check whether a row matches a rule
+def rule_matches(rule, row):
+    if rule.any_yes or rule.countries:
+        if not (any(sql_equals(row.get(column), 'YES') for column in rule.any_yes)
+                or any(sql_equals(row.get('COUNTRY_NAME_ENG'), country) for country in rule.countries)):
+            return False
+    if not all(sql_equals(row.get(column), 'NO') for column in rule.all_no):
+        return False
+    if rule.min_cpi_score is not None:
+        cpi_score = row.get('CPI_SCORE')
+        if cpi_score is None or cpi_score < rule.min_cpi_score:
+            return False
+    return True
+
+
+# Return the three outputs of the first rule matching the row
+def classify(row):
+    for rule in DECISION_TABLE:
+        if rule_matches(rule, row):
+            return rule.outputs
+    return DEFAULT_OUTPUTS
+
+
+# Classify every row in a single pass, keyed by SanctionsMapId
+def classify_rows(rows):
+    return {row['SanctionsMapId']: dict(zip(CLASSIFICATION_COLUMNS, classify(row))) for row in rows}
+
+
+# Compare the classification of every row with the values stored in the table and return the changes
+def plan_classification(snapshot):
+    classifications = classify_rows(snapshot)
+    changes = []
+    for row in snapshot:
+        for column, new_value in classifications[row['SanctionsMapId']].items():
+            old_value = row.get(column)
+            if old_value != new_value:
+                changes.append(Change(SOURCE, row['SanctionsMapId'], row.get('COUNTRY_NAME_ENG'), column, old_value, new_value))
+    return ChangePlan(changes)
+
+
+# Build a query returning every row alongside the outputs of the former SQL CASE expressions
+def get_reference_select_sql():
+    expressions = re.findall(r'(\w+) AS \(\s*(CASE.*?END)\s*\)', get_sanctions_map_columns_sql(), re.DOTALL)
+    select_list = ',\n'.join(f"({expression}) AS [SQL_{column}]" for column, expression in expressions)
+    return f"SELECT *,\n{select_list}\nFROM TblSanctionsMap"
+
+
+# Check that the engine gives the same outputs as the SQL CASE expressions on the current table, and return the differences
+def check_equivalence(cursor):
+    cursor.execute(get_reference_select_sql())
+    columns = [column[0] for column in cursor.description]
+    mismatches = []
+
+    for row in (dict(zip(columns, values)) for values in cursor.fetchall()):
+        for column, engine_value in zip(CLASSIFICATION_COLUMNS, classify(row)):
+            sql_value = row[f'SQL_{column}']
+            if engine_value != sql_value:
+                mismatches.append((row['SanctionsMapId'], row.get('COUNTRY_NAME_ENG'), column, sql_value, engine_value))
+
+    for sanctions_map_id, country, column, sql_value, engine_value in mismatches:
+        logging.error(f"Classification mismatch for ID {sanctions_map_id} ({country}) in column {column}: SQL {sql_value}, engine {engine_value}")
+    if not mismatches:
+        logging.info("Classification engine matches the SQL rules on every row.")
+    return mismatches
+
+
+# Recompute the classification columns from the current table state and write the rows that changed
+def refresh_classification(cnx):
+    cursor = cnx.cursor()
+    try:
+        plan = plan_classification(load_snapshot(cursor))
+        if plan:
+            plan.apply(cursor)
+            cnx.commit()
+        logging.info(f"Classification refreshed: {len(plan)} changes.")
+        check_equivalence(cursor)
+    except Exception:
+        cnx.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,137 @@
+"""
+This module owns the schema changes made to TblSanctionsMap during a run.
+The column types required by the updaters are checked once, before any updater writes, and altered only when they differ.
+When every column already has the expected type, no DDL is issued.
+
+The classification columns LEVEL_OF_RISK, LEVEL_OF_VIGILANCE and LIST are ordinary columns filled by the RiskEngine.
+Tables still carrying them as computed columns are migrated once, and the guard refreshes the classification on exit,
+whether or not the writes succeeded, so it always reflects what was committed.
+
+The guard also creates, once, the persisted COUNTRY_KEY column (the English name with plain quotes, trimmed and upper
+case) and the indexes on COUNTRY_KEY and COUNTRY_NAME_FR, so that lookups by country name are index seeks,
+and the updaters' own tables, such as the OFAC entity tables, when they are missing.
+"""
+
+# Import required libraries
+import re
+import logging
+from Logic.RiskEngine import CLASSIFICATION_COLUMNS, CLASSIFICATION_COLUMN_TYPE, refresh_classification
+
+# Persisted lookup key of the English country name, kept in sync by SQL Server
+COUNTRY_KEY_COLUMN = 'COUNTRY_KEY'
+COUNTRY_KEY_EXPRESSION = "UPPER(LTRIM(RTRIM(REPLACE([COUNTRY_NAME_ENG], N'’', N''''))))"
+
+# Indexes of the country name lookups, by index name
+LOOKUP_INDEXES = {
+    'IX_TblSanctionsMap_COUNTRY_KEY': COUNTRY_KEY_COLUMN,
+    'IX_TblSanctionsMap_COUNTRY_NAME_FR': 'COUNTRY_NAME_FR',
+}
+
+# Column types such as NVARCHAR(50), VARCHAR(3), NVARCHAR(MAX) or INT
+COLUMN_TYPE_PATTERN = re.compile(r'^\s*(\w+)\s*(?:\(\s*(\d+|MAX)\s*\))?\s*$', re.IGNORECASE)
+
+
+# Split a column type into its lower-case name and length, the way INFORMATION_SCHEMA reports it
+def parse_column_type(column_type):
+    match = COLUMN_TYPE_PATTERN.match(column_type)
+    if not match:
+        raise ValueError(f"Invalid column type: {column_type}")
+    name, length = match.groups()
+    if length is None:
+        return name.lower(), None
+    return name.lower(), -1 if length.upper() == 'MAX' else int(length)
+
+
+class SchemaGuard:
+
+    # Initialize the guard with the connection, the column types required by the updaters of the run and the statements
+    # creating their own tables when missing
+    def __init__(self, cnx, column_types, table_definitions=None):
+        self.cnx = cnx
+        self.column_types = column_types
+        self.table_definitions = table_definitions or []
+
+    # Read the current column types, the computed columns and the indexes present on the table
+    def read_schema(self, cursor):
+        cursor.execute("""
+            SELECT [COLUMN_NAME], [DATA_TYPE], [CHARACTER_MAXIMUM_LENGTH]
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE [TABLE_NAME] = 'TblSanctionsMap'
+        """)
+        current_types = {row[0]: (row[1].lower(), row[2]) for row in cursor.fetchall()}
+        cursor.execute("""
+            SELECT [name]
+            FROM sys.computed_columns
+            WHERE [object_id] = OBJECT_ID('TblSanctionsMap')
+        """)
+        computed_columns = {row[0] for row in cursor.fetchall()}
+        cursor.execute("""
+            SELECT [name]
+            FROM sys.indexes
+            WHERE [object_id] = OBJECT_ID('TblSanctionsMap') AND [name] IS NOT NULL
+        """)
+        indexes = {row[0] for row in cursor.fetchall()}
+        return current_types, computed_columns, indexes
+
+    # Replace the former computed classification columns with ordinary ones, and create them if missing
+    def migrate_classification_columns(self, cursor, current_types, computed_columns):
+        computed = [column for column in CLASSIFICATION_COLUMNS if column in computed_columns]
+        missing = [column for column in CLASSIFICATION_COLUMNS if column in computed or column not in current_types]
+        if not missing:
+            return
+
+        if computed:
+            logging.info(f"Dropping computed classification columns ({', '.join(computed)})...")
+            cursor.execute(f"ALTER TABLE TblSanctionsMap DROP COLUMN {', '.join(computed)}")
+        logging.info(f"Adding classification columns ({', '.join(missing)})...")
+        cursor.execute(f"ALTER TABLE TblSanctionsMap ADD {', '.join(f'{column} {CLASSIFICATION_COLUMN_TYPE} NULL' for column in missing)}")
+
+    # Add the persisted country key and the lookup indexes if missing
+    def create_lookup_indexes(self, cursor, current_types, indexes):
+        if COUNTRY_KEY_COLUMN not in current_types:
+            logging.info(f"Adding persisted column {COUNTRY_KEY_COLUMN}...")
+            cursor.execute(f"ALTER TABLE TblSanctionsMap ADD [{COUNTRY_KEY_COLUMN}] AS {COUNTRY_KEY_EXPRESSION} PERSISTED")
+        for index_name, column in LOOKUP_INDEXES.items():
+            if index_name not in indexes:
+                logging.info(f"Creating index {index_name}...")
+                cursor.execute(f"CREATE NONCLUSTERED INDEX [{index_name}] ON TblSanctionsMap ([{column}])")
+
+    # Migrate the classification columns, create the lookup indexes and alter the column types, only if needed
+    def __enter__(self):
+        cursor = self.cnx.cursor()
+        try:
+            current_types, computed_columns, indexes = self.read_schema(cursor)
+
+            pending_types = {}
+            for column, column_type in self.column_types.items():
+                if column not in current_types:
+                    logging.warning(f"Column {column} does not exist in TblSanctionsMap, skipping type check.")
+                elif current_types[column] != parse_column_type(column_type):
+                    pending_types[column] = column_type
+
+            self.migrate_classification_columns(cursor, current_types, computed_columns)
+            self.create_lookup_indexes(cursor, current_types, indexes)
+            for table_definition in self.table_definitions:
+                cursor.execute(table_definition)
+
+            for column, column_type in pending_types.items():
+                logging.info(f"Altering column [{column}] to {column_type}...")
+                cursor.execute(f"ALTER TABLE TblSanctionsMap ALTER COLUMN [{column}] {column_type}")
+
+            if not pending_types:
+                logging.info("Column types are up to date.")
+            self.cnx.commit()
+        except Exception:
+            self.cnx.rollback()
+            raise
+        finally:
+            cursor.close()
+        return self
+
+    # Refresh the classification columns from the committed table state
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            refresh_classification(self.cnx)
+        except Exception as e:
+            logging.error(f"Error refreshing the risk classification: {e}")
+        return False
@@ -0,0 +1,210 @@
+"""
+This module builds and queries the name-screening index of the OFAC SDN entities.
+Every entity name and alias is normalized (unidecode, upper case, letters and digits only) and split into character
+trigrams. The index file stores a sorted table of trigram keys, a postings list of name ids per trigram, and the name
+table, all as flat arrays of unsigned 32-bit integers. It is opened with mmap and read in place, so loading it costs
+nothing and several processes share the same pages.
+
+screen(names) scores candidates with the Dice coefficient on trigram sets. Candidates are only gathered from the rarest
+trigrams of each query (prefix filtering), then verified against the remaining postings lists, dropping along the way
+the candidates that can no longer reach the threshold.
+"""
+
+# Import required libraries
+import os
+import re
+import sys
+import math
+import mmap
+import struct
+import bisect
+import logging
+from array import array
+from collections import Counter, namedtuple
+from unidecode import unidecode
+
+# File signature and header: signature, trigram count, postings count, name count, name blob size
+MAGIC = b'SDNIDX1\0'
+HEADER = struct.Struct('<8sIIII')
+
+# Minimum Dice score of a hit, and maximum number of hits returned per name
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_LIMIT = 10
+
+# Relative cost of a binary search over reading one postings entry, used to choose how candidates are verified
+BISECT_COST = 16
+
+NON_ALPHANUMERIC_PATTERN = re.compile(r'[^A-Z0-9]+')
+
+# A screening hit: SDN entity id, matched name or alias, and Dice score
+Hit = namedtuple('Hit', ['entity_id', 'name', 'score'])
+
+if array('I').itemsize != 4:
+    raise ImportError("The screening index requires 32-bit unsigned integer arrays.")
+
+
+# Normalize a name for screening: transliterated, upper case, letters and digits separated by single spaces
+def normalize_name(name):
+    return NON_ALPHANUMERIC_PATTERN.sub(' ', unidecode(name or '').upper()).strip()
+
+
+# Return the trigram keys of a normalized name, each trigram packed in an integer
+def trigram_keys(normalized_name):
+    if not normalized_name:
+        return set()
+    padded = f"  {normalized_name} ".encode('ascii', 'ignore')
+    return {int.from_bytes(padded[i:i + 3], 'big') for i in range(len(padded) - 2)}
+
+
+# Build the index file from (entity_id, name) pairs, names and aliases alike
+def build_index(entries, path):
+    names = []
+    seen = set()
+    for entity_id, name in entries:
+        normalized_name = normalize_name(name)
+        if normalized_name and (entity_id, normalized_name) not in seen:
+            seen.add((entity_id, normalized_name))
+            names.append((int(entity_id), normalized_name))
+
+    postings_by_key = {}
+    name_entities = array('I')
+    name_trigram_counts = array('I')
+    name_offsets = array('I', [0])
+    blob = bytearray()
+    for name_id, (entity_id, normalized_name) in enumerate(names):
+        keys = trigram_keys(normalized_name)
+        for key in keys:
+            postings_by_key.setdefault(key, []).append(name_id)
+        name_entities.append(entity_id)
+        name_trigram_counts.append(len(keys))
+        blob += normalized_name.encode('ascii')
+        name_offsets.append(len(blob))
+
+    keys = array('I', sorted(postings_by_key))
+    posting_offsets = array('I', [0])
+    postings = array('I')
+    for key in keys:
+        postings.extend(postings_by_key[key])
+        posting_offsets.append(len(postings))
+
+    arrays = [keys, posting_offsets, postings, name_entities, name_trigram_counts, name_offsets]
+    if sys.byteorder != 'little':
+        for values in arrays:
+            values.byteswap()
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as index_file:
+        index_file.write(HEADER.pack(MAGIC, len(keys), len(postings), len(names), len(blob)))
+        for values in arrays:
+            values.tofile(index_file)
+        index_file.write(blob)
+    os.replace(temp_path, path)
+    logging.info(f"Screening index built with {len(names)} names and {len(keys)} trigrams: {path}")
+
+
+class ScreeningIndex:
+
+    # Open an index file and map its arrays without copying them
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise OSError("The screening index can only be memory-mapped on little-endian hosts.")
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, trigram_count, posting_count, name_count, blob_size = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a screening index: {path}")
+
+        view = memoryview(self.map)
+        offset = HEADER.size
+
+        def take(count):
+            nonlocal offset
+            values = view[offset:offset + 4 * count].cast('I')
+            offset += 4 * count
+            return values
+
+        self.keys = take(trigram_count)
+        self.posting_offsets = take(trigram_count + 1)
+        self.postings = take(posting_count)
+        self.name_entities = take(name_count)
+        self.name_trigram_counts = take(name_count)
+        self.name_offsets = take(name_count + 1)
+        self.blob = view[offset:offset + blob_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    # Release the mapped arrays and the file
+    def close(self):
+        for values in (self.keys, self.posting_offsets, self.postings, self.name_entities,
+                       self.name_trigram_counts, self.name_offsets, self.blob):
+            values.release()
+        self.map.close()
+        self.file.close()
+
+    # Return the sorted postings list (name ids) of a trigram key, empty if the trigram is unknown
+    def postings_for(self, key):
+        position = bisect.bisect_left(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            return self.postings[0:0]
+        return self.postings[self.posting_offsets[position]:self.posting_offsets[position + 1]]
+
+    # Return the normalized name of a name id
+    def name(self, name_id):
+        return bytes(self.blob[self.name_offsets[name_id]:self.name_offsets[name_id + 1]]).decode('ascii')
+
+    # Screen a single name and return its best hits, one per entity
+    def screen_name(self, name, threshold=DEFAULT_THRESHOLD, limit=DEFAULT_LIMIT):
+        keys = trigram_keys(normalize_name(name))
+        if not keys:
+            return []
+
+        # A name sharing c of the q query trigrams scores 2c / (q + n) with n >= c, so c >= t.q / (2 - t)
+        query_count = len(keys)
+        min_common = max(1, math.ceil(threshold * query_count / (2 - threshold) - 1e-9))
+        lists = sorted((self.postings_for(key) for key in keys), key=len)
+        prefix_length = query_count - min_common + 1
+
+        candidates = Counter()
+        for postings in lists[:prefix_length]:
+            candidates.update(postings)
+
+        # Verify the candidates against the remaining lists, dropping those that can no longer reach min_common.
+        # Few candidates are looked up by binary search, many are intersected with the whole list.
+        suffix = lists[prefix_length:]
+        for remaining, postings in enumerate(suffix):
+            needed = min_common - (len(suffix) - remaining)
+            if needed > 1:
+                candidates = {name_id: common for name_id, common in candidates.items() if common >= needed}
+            if not candidates:
+                break
+            if len(candidates) * BISECT_COST < len(postings):
+                for name_id in candidates:
+                    position = bisect.bisect_left(postings, name_id)
+                    if position < len(postings) and postings[position] == name_id:
+                        candidates[name_id] += 1
+            else:
+                for name_id in candidates.keys() & set(postings):
+                    candidates[name_id] += 1
+
+        best = {}
+        for name_id, common in candidates.items():
+            if common < min_common:
+                continue
+            score = 2 * common / (query_count + self.name_trigram_counts[name_id])
+            if score >= threshold:
+                entity_id = self.name_entities[name_id]
+                if entity_id not in best or score > best[entity_id][1]:
+                    best[entity_id] = (name_id, score)
+
+        hits = [Hit(entity_id, self.name(name_id), round(score, 4)) for entity_id, (name_id, score) in best.items()]
+        hits.sort(key=lambda hit: (-hit.score, hit.entity_id))
+        return hits[:limit]
+
+    # Screen a batch of names and return the hits of each, in the same order
+    def screen(self, names, threshold=DEFAULT_THRESHOLD, limit=DEFAULT_LIMIT):
+        return [self.screen_name(name, threshold, limit) for name in names]
@@ -0,0 +1,201 @@
+"""
+This module defines the stage contract shared by every updater.
+Each updater is split into four stages that can be run, cached and replayed independently:
+
+- fetch(): downloads the raw documents from the source
+- parse(documents): turns the raw documents into a list of CountryFlag
+- plan(flags, snapshot): compares the flags with the current table state and returns a minimal ChangePlan
+- apply(plan, cursor): writes a ChangePlan to the database, without committing
+
+Documents are downloaded through http_get(), which goes through the request scheduler pacing every host and the shared
+HTTP cache: when every document of a source is identical to the ones behind its last applied run, fetch_and_parse()
+skips the parse stage and returns None.
+
+Database access goes through the RunContext of the run, which owns the connection pool and the table snapshot
+shared by every updater; an updater run on its own creates its own context.
+Parsed country names are resolved to the SanctionsMapId of their row by the CountryResolver of the context,
+and the plan stage joins flags and rows on that id.
+
+Updaters never issue DDL themselves: the column types they need are enforced once per run by the SchemaGuard,
+which also refreshes the risk classification once the updaters have written.
+"""
+
+# Import required libraries
+import logging
+import pyodbc
+from Logic.Database import RunContext
+from collections import namedtuple
+from Logic.ChangePlan import Change, ChangePlan
+from Logic.SchemaGuard import SchemaGuard
+from Logic.HttpCache import get_http_cache
+from Logic.HttpClient import get_session
+from Logic.RequestScheduler import get_scheduler
+
+# Desired value of one TblSanctionsMap column for one country, as parsed from a source
+CountryFlag = namedtuple('CountryFlag', ['country', 'column', 'value'])
+
+
+class BaseUpdater:
+
+    # Name of the updater in change plans and on the command line
+    source = None
+
+    # Columns of TblSanctionsMap written by the updater
+    columns = []
+
+    # Column whose names are tried first when resolving the parsed countries
+    match_column = 'COUNTRY_NAME_ENG'
+
+    # Value given to the rows missing from the parsed flags; None leaves them unchanged
+    default_value = 'NO'
+
+    # SQL type the written columns must have; None leaves the column type alone
+    column_type = None
+
+    # Content hash of every document downloaded by the last fetch, keyed by URL
+    fingerprint = None
+
+    # Database context of the run, shared with the other updaters
+    context = None
+
+    # Fetch stage: download the raw documents from the source
+    def fetch(self):
+        raise NotImplementedError
+
+    # Parse stage: turn the raw documents into a list of CountryFlag
+    def parse(self, documents):
+        raise NotImplementedError
+
+    # Return the database context of the run, creating one when the updater runs on its own
+    def get_context(self):
+        if self.context is None:
+            self.context = RunContext(self.conn_str)
+        return self.context
+
+    # Download a document through the shared HTTP cache and record its content hash
+    def http_get(self, url, session=None, **kwargs):
+        response = get_http_cache().get(url, session=session, **kwargs)
+        if response.status_code == 200:
+            if self.fingerprint is None:
+                self.fingerprint = {}
+            self.fingerprint[url] = response.sha256
+        return response
+
+    # Stream a large document through the shared HTTP cache; its content hash is recorded once the body has been read
+    def http_stream(self, url, session=None, **kwargs):
+        if self.fingerprint is None:
+            self.fingerprint = {}
+
+        def record(sha256):
+            self.fingerprint[url] = sha256
+
+        response = get_http_cache().stream(url, session=session, on_complete=record, **kwargs)
+        if response.status_code == 200 and response.sha256:
+            record(response.sha256)
+        return response
+
+    # Send a HEAD request through the request scheduler; HEAD answers are not cached
+    def http_head(self, url, **kwargs):
+        return get_scheduler().send(url, lambda: get_session().head(url, **kwargs))
+
+    # Check whether the last fetch downloaded exactly the documents the source was last applied from
+    def is_unchanged(self):
+        return bool(self.fingerprint) and self.fingerprint == get_http_cache().applied_fingerprint(self.source)
+
+    # Record the documents of the last fetch as applied to the database
+    def mark_applied(self):
+        if self.fingerprint:
+            get_http_cache().mark_applied(self.source, self.fingerprint)
+
+    # Fetch and parse stages; returns None without parsing when no document changed since the last applied run
+    def fetch_and_parse(self, force=False):
+        self.fingerprint = {}
+        documents = self.fetch()
+        if not force and self.is_unchanged():
+            logging.info(f"{self.source}: documents unchanged since the last applied run, parse and plan skipped.")
+            return None
+        return self.parse(documents)
+
+    # Key used to match a table row against the parsed flags
+    def row_key(self, row):
+        return row['SanctionsMapId']
+
+    # Key used to match a parsed flag against the table rows: the SanctionsMapId of its country, None if unknown
+    def flag_key(self, country):
+        return self.get_context().country_resolver().resolve(country, self.match_column)
+
+    # Plan stage: compare the parsed flags with the table snapshot and return the minimal set of changes
+    def plan(self, flags, snapshot):
+        if not flags:
+            logging.warning(f"{self.source}: no data parsed, no changes planned.")
+            return ChangePlan()
+
+        desired = {}
+        unknown_countries = set()
+        for flag in flags:
+            key = self.flag_key(flag.country)
+            if key is None:
+                unknown_countries.add(flag.country)
+            else:
+                desired[(key, flag.column)] = flag.value
+        changes = []
+
+        for row in snapshot:
+            key = self.row_key(row)
+            for column in self.columns:
+                if (key, column) in desired:
+                    new_value = desired[(key, column)]
+                elif self.default_value is not None:
+                    new_value = self.default_value
+                else:
+                    continue
+
+                old_value = row.get(column)
+                if old_value != new_value:
+                    changes.append(Change(self.source, row['SanctionsMapId'], row[self.match_column], column, old_value, new_value))
+
+        for country in sorted(unknown_countries):
+            logging.warning(f"{self.source}: country {country} not found in the database.")
+
+        return ChangePlan(changes)
+
+    # Column types required by the updater, enforced once per run by the SchemaGuard
+    def column_types(self):
+        if self.column_type is None:
+            return {}
+        return {column: self.column_type for column in self.columns}
+
+    # Statements creating the updater's own tables when they are missing, run once per run by the SchemaGuard
+    def table_definitions(self):
+        return []
+
+    # Whether the updater has writes to apply besides its plan, such as tables of its own
+    def has_pending_writes(self):
+        return False
+
+    # Apply stage: write the planned changes; the caller owns the transaction and the schema changes
+    def apply(self, plan, cursor):
+        plan.apply(cursor)
+
+    # Run every stage of the updater, on its own
+    def run(self, force=False):
+        flags = self.fetch_and_parse(force)
+        # Streamed documents are recorded in the cache index once parsed, so the index is written after the parse stage
+        get_http_cache().flush()
+        if flags is None:
+            return
+        context = self.get_context()
+        try:
+            plan = self.plan(flags, context.snapshot())
+            plan.log_summary()
+            with context.pool.connection() as cnx:
+                cursor = cnx.cursor()
+                tables = self.table_definitions() if plan or self.has_pending_writes() else []
+                with SchemaGuard(cnx, self.column_types() if plan else {}, tables):
+                    if plan or self.has_pending_writes():
+                        self.apply(plan, cursor)
+                        cnx.commit()
+                self.mark_applied()
+                cursor.close()
+        except pyodbc.Error as e:
+            logging.error(f"Database error during {self.source} updates: {e}")
@@ -1,20 +1,24 @@
 """
-This script fetches the Corruption Perceptions Index (CPI) data from the Transparency International website.
-It then compares the fetched data with the existing data in the SQL database and updates the database with the new data.
-The script also checks for any changes in the data and logs them.
+This script fetches the Corruption Perceptions Index (CPI) data from the Transparency International website,
+or from the yearly CPI results file when CPI_DATASET is set, and updates CPI_SCORE and CPI_RANK in the database.
 """
 
 
 # Importing required libraries
+import io
 import re
 import os
+import csv
+import hashlib
 import dotenv
-import requests
-from bs4 import BeautifulSoup
+from openpyxl import load_workbook
+from bs4 import SoupStrainer
 from unidecode import unidecode
-import pyodbc
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
+from Logic.Updater import BaseUpdater, CountryFlag
+from Logic.CountryResolver import normalize_country_name
+from Logic.HtmlParser import parse_html
 
 
 # Load environment variables from .env file
@@ -29,8 +33,33 @@ database = os.getenv('DATABASE')
 uid = os.getenv('UID')
 pwd = os.getenv('PWD')
 
+# Transparency International CPI results file (CSV or XLSX), as a local path or a URL; every country page is scraped when unset
+CPI_DATASET = os.getenv('CPI_DATASET')
+
+# Columns read from the results file, matched against the upper-cased header cells. The first matching column is
+# read, which is the latest year in the files covering several years; the ISO-3166 code column is optional.
+DATASET_COLUMN_PATTERNS = {
+    'country': re.compile(r'^COUNTRY'),
+    'iso3': re.compile(r'^ISO\s*3$'),
+    'score': re.compile(r'^CPI.*SCORE'),
+    'rank': re.compile(r'^RANK$'),
+}
+
+# Number of leading rows of the results file searched for its header row
+DATASET_HEADER_ROWS = 20
+
+# Country pages scraped in parallel, for the countries missing from the results file
+DOWNLOAD_WORKERS = 16
+
+# Score and rank of the country page, the only tags read from it
+PARSE_ONLY = SoupStrainer(['dt', 'dd'])
+
 # Class to update the Corruption Perceptions Index (CPI) data in the SQL database
-class CPIUpdater:
+class CPIUpdater(BaseUpdater):
+
+    source = 'CPI'
+    columns = ['CPI_SCORE', 'CPI_RANK']
+    default_value = None
 
     # Constructor to initialize the database name and connection string
     def __init__(self, db_name):
@@ -42,49 +71,22 @@ class CPIUpdater:
             f'UID={uid};'
             f'PWD={pwd}'
         )
-        self.updates = []
-        self.changes = []
-
-    # Method to normalize the country name
-    def normalize_country_name(self, country_name):
-        # Normalize country name by removing extra spaces, handling quotes, and using unidecode
-        country_name = unidecode(country_name.strip().upper())
-        country_name = country_name.replace('’', "'")  # Replace smart quotes with standard quotes
-        return country_name
-
-    # Method to get the list of countries from the database
-    def get_countries_from_database(self):
+        # Scores and ranks read from the results file by the last fetch, keyed by SanctionsMapId
+        self.dataset_scores = None
+
+    # Method to get the list of countries from the database, except those whose SanctionsMapId is in covered
+    def get_countries_from_database(self, covered=()):
         countries = []
         try:
-            cnx = pyodbc.connect(self.conn_str)
-            cursor = cnx.cursor()
-            cursor.execute("SELECT [COUNTRY_NAME_ENG] FROM TblSanctionsMap")
-            for row in cursor.fetchall():
+            for row in self.get_context().snapshot():
+                if row['SanctionsMapId'] in covered:
+                    continue
                 # Normalize the country names before adding them to the list
-                countries.append(self.normalize_country_name(row[0]))
-            cursor.close()
-            cnx.close()
+                countries.append(normalize_country_name(row['COUNTRY_NAME_ENG']))
         except Exception as e:
             logging.error(f"Error fetching countries from database: {e}")
         return countries
 
-    # Method to get the current data from the database
-    def get_current_data_from_database(self, country_name):
-        try:
-            cnx = pyodbc.connect(self.conn_str)
-            cursor = cnx.cursor()
-            cursor.execute("SELECT [CPI_SCORE], [CPI_RANK] FROM TblSanctionsMap WHERE [COUNTRY_NAME_ENG] = ?", country_name)
-            row = cursor.fetchone()
-            cursor.close()
-            cnx.close()
-            if row:
-                return row[0], row[1]  # score, rank
-            else:
-                return None, None
-        except Exception as e:
-            logging.error(f"Error fetching current data from database: {e}")
-            return None, None
-
     # Method to format the country name for URL use
     def format_country_name(self, country_name):
         # Format the country name for URL use
@@ -100,17 +102,107 @@ class CPIUpdater:
         except ValueError:
             return False
 
-    # Method to parse the country details from the Transparency International website
-    def parse_country_details(self, country_name):
+    # Return a score or rank of the results file as an integer, or None if the cell is not a number
+    def dataset_number(self, value):
+        if value is None or not self.is_valid_number(value):
+            return None
+        return int(float(value))
+
+    # Read the CPI results file from its local path or through the HTTP cache, or None if it is unavailable
+    def read_dataset(self):
+        if re.match(r'^https?://', CPI_DATASET):
+            response = self.http_get(CPI_DATASET)
+            if response.status_code != 200:
+                logging.error(f"Could not download the CPI results file {CPI_DATASET}: HTTP {response.status_code}")
+                return None
+            return response.content
+
+        try:
+            with open(CPI_DATASET, 'rb') as dataset_file:
+                content = dataset_file.read()
+        except OSError as e:
+            logging.error(f"Could not read the CPI results file {CPI_DATASET}: {e}")
+            return None
+        # A local file is fingerprinted like a download, so that an unchanged file skips the parse and plan stages
+        if self.fingerprint is None:
+            self.fingerprint = {}
+        self.fingerprint[CPI_DATASET] = hashlib.sha256(content).hexdigest()
+        return content
+
+    # Yield the rows of the results file as lists of cells; XLSX files are zip archives, anything else is read as CSV
+    def iter_dataset_rows(self, content):
+        if content[:2] == b'PK':
+            workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+            try:
+                yield from workbook.active.iter_rows(values_only=True)
+            finally:
+                workbook.close()
+        else:
+            yield from csv.reader(io.StringIO(content.decode('utf-8-sig')))
+
+    # Return the index of every column read from the results file, or None if the row is not the header row
+    def dataset_columns(self, cells):
+        columns = {}
+        for index, cell in enumerate(cells):
+            header = cell.upper()
+            for name, pattern in DATASET_COLUMN_PATTERNS.items():
+                if name not in columns and pattern.match(header):
+                    columns[name] = index
+        if not {'country', 'score', 'rank'} <= set(columns):
+            return None
+        return columns
+
+    # Read the CPI score and rank of every country of the results file, keyed by SanctionsMapId
+    def parse_dataset(self, content):
+        resolver = self.get_context().country_resolver()
+        scores = {}
+        unknown_countries = []
+        columns = None
+
+        for row_number, row in enumerate(self.iter_dataset_rows(content)):
+            cells = ['' if cell is None else str(cell).strip() for cell in row]
+            if columns is None:
+                columns = self.dataset_columns(cells)
+                if columns is None and row_number >= DATASET_HEADER_ROWS:
+                    logging.error(f"No header row with country, CPI score and rank columns found in {CPI_DATASET}.")
+                    return {}
+                continue
+
+            def cell(name):
+                index = columns.get(name)
+                return cells[index] if index is not None and index < len(cells) else ''
+
+            country = cell('country')
+            if not country:
+                continue
+            sanctions_map_id = resolver.resolve_code(cell('iso3')) or resolver.resolve(country)
+            if sanctions_map_id is None:
+                unknown_countries.append(country)
+                continue
+            scores.setdefault(sanctions_map_id, (self.dataset_number(cell('score')), self.dataset_number(cell('rank'))))
+
+        if unknown_countries:
+            logging.warning(f"Countries of the CPI results file not found in the database: {', '.join(unknown_countries)}")
+        return scores
+
+    # Method to download the country's page on the Transparency International website
+    def fetch_country_page(self, country_name):
         formatted_country_name = self.format_country_name(country_name)
         url = f'https://www.transparency.org/en/countries/{formatted_country_name}' # URL for the country's page on Transparency International website
-        response = requests.get(url)
+        response = self.http_get(url)
 
         if response.status_code == 404:
-            return 'N/A', 'N/A'
+            return None
 
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
+        return response.content
+
+    # Method to parse the country details from the Transparency International website
+    def parse_country_details(self, content):
+        if content is None:
+            return 'N/A', 'N/A'
+
+        soup = parse_html(content, PARSE_ONLY)
 
         score_tag = soup.find('dt', string='Score')
         score = score_tag.find_next('dd').get_text(strip=True).split('/')[0] if score_tag else 'N/A'
@@ -125,93 +217,55 @@ class CPIUpdater:
 
         return score, rank
 
-    # Method to fetch and compare the country details
-    def fetch_and_compare_country_details(self, country_name):
-        score, rank = self.parse_country_details(country_name)
-        if score == 'N/A':
-            score = None
-        else:
-            score = int(float(score))  # Ensure the score is an integer
-        if rank == 'N/A':
-            rank = None
-        else:
-            rank = int(rank)  # Ensure the rank is an integer
-
-        current_score, current_rank = self.get_current_data_from_database(country_name)
-        changes = []
-        if current_score != score:
-            changes.append((country_name, 'CPI_SCORE', current_score, score))
-        if current_rank != rank:
-            changes.append((country_name, 'CPI_RANK', current_rank, rank))
-        self.changes.extend(changes)
-
-        return (country_name, score, rank)
-
-    # Method to update the database with the new CPI data
-    def update_database_CPI(self, countries):
-        updates = []
-        try:
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                futures = {executor.submit(self.fetch_and_compare_country_details, country): country for country in countries}
-                for future in as_completed(futures):
-                    try:
-                        result = future.result()
-                        updates.append(result)
-                    except Exception as e:
-                        logging.error(f"Error fetching and comparing country details: {e}")
-
-            cnx = pyodbc.connect(self.conn_str)
-            cursor = cnx.cursor()
-
-            for update in updates:
-                country_name, score, rank = update
-                update_query = """
-                    UPDATE TblSanctionsMap
-                    SET [CPI_SCORE] = ?, [CPI_RANK] = ?
-                    WHERE [COUNTRY_NAME_ENG] = ?
-                """
-                # Normalize the country name before executing the update
-                normalized_country_name = self.normalize_country_name(country_name)
-                cursor.execute(update_query, score, rank, normalized_country_name)
-                logging.info(f"Updated {normalized_country_name} with CPI Score: {score}, Rank: {rank}")
-
-            cnx.commit()
-            cursor.close()
-            cnx.close()
-
-        except Exception as e:
-            logging.error(f"Error updating SQL database: {e}")
-
-        self.updates = updates
-        return updates
-
-    # Method to check for changes in the database
-    def check_database_changes_CPI(self, updates):
-        changes = []
-        try:
-            cnx = pyodbc.connect(self.conn_str)
-            cursor = cnx.cursor()
-            for country_name, new_score, new_rank in updates:
-                cursor.execute("SELECT [CPI_SCORE], [CPI_RANK] FROM TblSanctionsMap WHERE [COUNTRY_NAME_ENG] = ?",
-                               country_name)
-                result = cursor.fetchone()
-                if result:
-                    old_score, old_rank = result
-                    if old_score != new_score:
-                        changes.append((country_name, 'CPI_SCORE', old_score, new_score))
-                    if old_rank != new_rank:
-                        changes.append((country_name, 'CPI_RANK', old_rank, new_rank))
-                        if new_rank.upper() == 'YES':
-                            logging.info(f"Country: {country_name}, Old Rank: {old_rank}, New Rank: {new_rank}")
-            cursor.close()
-            cnx.close()
-        except Exception as e:
-            logging.error(f"Error checking database changes: {e}")
-        return changes
-
-    # Method to collect the updates
-    def collect_updates(self):
-        return self.updates
+    # Fetch stage: read the results file when one is configured, then download the page of every database country
+    # missing from it
+    def fetch(self):
+        documents = {'dataset': None, 'pages': {}}
+        self.dataset_scores = None
+
+        if CPI_DATASET:
+            documents['dataset'] = self.read_dataset()
+            if documents['dataset'] is not None:
+                self.dataset_scores = self.parse_dataset(documents['dataset'])
+                logging.info(f"Read the CPI data of {len(self.dataset_scores)} countries from {CPI_DATASET}.")
+
+        # Fetch countries from the database
+        countries = self.get_countries_from_database(covered=self.dataset_scores or ())
+        if not countries:
+            logging.info("No countries left to scrape.")
+            return documents
+        if self.dataset_scores:
+            logging.info(f"Scraping the {len(countries)} countries missing from the CPI results file.")
+
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            futures = {executor.submit(self.fetch_country_page, country): country for country in countries}
+            for future in as_completed(futures):
+                country = futures[future]
+                try:
+                    documents['pages'][country] = future.result()
+                except Exception as e:
+                    logging.error(f"Error fetching country details for {country}: {e}")
+        return documents
+
+    # Parse stage: read the CPI score and rank of every country of the results file and of every downloaded page
+    def parse(self, documents):
+        flags = []
+        if documents['dataset'] is not None:
+            dataset_scores = self.dataset_scores if self.dataset_scores is not None else self.parse_dataset(documents['dataset'])
+            country_names = {row['SanctionsMapId']: row['COUNTRY_NAME_ENG'] for row in self.get_context().snapshot()}
+            for sanctions_map_id, (score, rank) in dataset_scores.items():
+                flags.append(CountryFlag(country_names[sanctions_map_id], 'CPI_SCORE', score))
+                flags.append(CountryFlag(country_names[sanctions_map_id], 'CPI_RANK', rank))
+            logging.info(f"Parsed the CPI data of {len(dataset_scores)} countries from the results file.")
+
+        for country_name, content in documents['pages'].items():
+            score, rank = self.parse_country_details(content)
+            score = None if score == 'N/A' else int(float(score))  # Ensure the score is an integer
+            rank = None if rank == 'N/A' else int(rank)  # Ensure the rank is an integer
+            flags.append(CountryFlag(country_name, 'CPI_SCORE', score))
+            flags.append(CountryFlag(country_name, 'CPI_RANK', rank))
+            logging.info(f"Parsed {country_name} with CPI Score: {score}, Rank: {rank}")
+        return flags
 
 
 def main():
@@ -219,23 +273,9 @@ def main():
     # Initialize the CPIUpdater object
     updater = CPIUpdater(database)
 
-    # Fetch countries from the database
-    countries = updater.get_countries_from_database()
-    if not countries:
-        logging.info("No countries found in the database.")
-        return
-
-    # Update the database with new CPI data
+    # Read the scores and ranks, and write the changed ones
     logging.info("Updating the database with new CPI data...")
-    updates = updater.update_database_CPI(countries)
-
-    # Print collected updates and changes
-    updates = updater.collect_updates()
-    changes = updater.check_database_changes_CPI(updates)
-
-    logging.info("\nCollected Updates:")
-    for update in updates:
-        logging.info(update)
+    updater.run()
 
 
 if __name__ == "__main__":
@@ -1,19 +1,26 @@
 """
-This script fetches the EU sanctions data from the Sanctions Map website.
-It then compares the fetched data with the existing data in the SQL database and updates the database with the new data.
-The script also checks for any changes in the data and logs them.
+This script fetches the EU sanctions data from the Sanctions Map website, one combined PDF per batch of regimes,
+and updates the EU measure columns of the database with the new data.
+Run with --check-combined to parse the combined PDF excerpts of fixtures/eusanctions, and with --benchmark-statements
+to compare the statements sent with those of the former per-country queries.
 """
 
 # Import required libraries
 import os
 import re
+import sys
+import json
+import datetime
 import dotenv
-import requests
-import pyodbc
 import logging
+import multiprocessing
 from io import BytesIO
-from unidecode import unidecode
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import PyPDF2
+from Logic.Updater import BaseUpdater, CountryFlag
+from Logic.CountryResolver import normalize_country_name
+from Logic.HttpCache import get_http_cache
 
 # Load environment variables from .env file
 dotenv.load_dotenv()
@@ -27,9 +34,62 @@ database = os.getenv('DATABASE')
 uid = os.getenv('UID')
 pwd = os.getenv('PWD')
 
+# Sanctions Map API listing the regimes, and the PDF export taking one or more regime ids
+REGIMES_URL = 'https://www.sanctionsmap.eu/api/v1/regime'
+REGIME_PDF_URL = 'https://www.sanctionsmap.eu/api/v1/pdf/regime?{}&lang=en'
+
+# Range of ids probed when the regime list cannot be retrieved
+PROBED_REGIME_IDS = range(1, 71)
+
+# Number of regimes requested in one combined PDF
+BATCH_SIZE = 25
+
+# How long the discovered regime ids are reused before being discovered again
+REGIME_DISCOVERY_MAX_AGE = datetime.timedelta(days=7)
+
+# Combined regime PDFs downloaded in parallel
+DOWNLOAD_WORKERS = 8
+
+# Number of processes parsing the regime PDFs
+PARSE_WORKERS = os.cpu_count() or 1
+
+# Start method of the parse processes. The pool is created while other threads download and log, and a forked child
+# could inherit one of their locks held, so the children are spawned instead
+PARSE_CONTEXT = multiprocessing.get_context('spawn')
+
+# Heading following the measures in a regime PDF, matched against whole normalized lines
+END_OF_MEASURES_PATTERN = re.compile(r'^(OTHER INFORMATION|USEFUL LINKS)$')
+
+# Characters ignored when looking for a regime title, so that a title is found whatever its punctuation
+TITLE_SEPARATOR_PATTERN = re.compile(r'[^A-Z0-9]+')
+
+# Lines a regime title may be wrapped on in a PDF
+MAX_TITLE_LINES = 3
+
+# Text extracted from combined PDFs, with the regime titles and flags they give, read by --check-combined
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures', 'eusanctions')
+FIXTURE_TITLES = ['Iran: human rights', 'Syria: restrictive measures',
+                  'Belarus: restrictive measures in view of the situation in Belarus']
+FIXTURE_UPDATES = {
+    'IRAN': {'EU_ASSET_FREEZE_AND_PROHIBITION_TO_MAKE_FUNDS_AVAILABLE': 'YES', 'EU_INVESTMENTS': 'NO',
+             'EU_FINANCIAL_MEASURES': 'NO'},
+    'SYRIA': {'EU_ASSET_FREEZE_AND_PROHIBITION_TO_MAKE_FUNDS_AVAILABLE': 'NO', 'EU_INVESTMENTS': 'YES',
+              'EU_FINANCIAL_MEASURES': 'YES'},
+    'BELARUS': {'EU_ASSET_FREEZE_AND_PROHIBITION_TO_MAKE_FUNDS_AVAILABLE': 'YES', 'EU_INVESTMENTS': 'NO',
+                'EU_FINANCIAL_MEASURES': 'YES'},
+}
+
+
+# Return a regime title, or a normalized PDF line, reduced to its words
+def title_key(text):
+    return TITLE_SEPARATOR_PATTERN.sub(' ', normalize_country_name(text)).strip()
+
 
 # Define the EUSanctionsUpdater class
-class EUSanctionsUpdater:
+class EUSanctionsUpdater(BaseUpdater):
+
+    source = 'EUsanctions'
+    columns = ['EU_ASSET_FREEZE_AND_PROHIBITION_TO_MAKE_FUNDS_AVAILABLE', 'EU_INVESTMENTS', 'EU_FINANCIAL_MEASURES']
 
     # Initialize the EUSanctionsUpdater class with the database name
     def __init__(self, db_name):
@@ -46,56 +106,172 @@ class EUSanctionsUpdater:
             re.compile(r'Investments', re.IGNORECASE): 'EU_INVESTMENTS',
             re.compile(r'Financial measures', re.IGNORECASE): 'EU_FINANCIAL_MEASURES'
         }
-        self.expected_countries = self.get_expected_countries()
-
-    # Normalize the country name by removing extra spaces, handling smart quotes, and applying unidecode
-    def normalize_country_name(self, country_name):
-        # Normalize country name by removing extra spaces, handling smart quotes, and applying unidecode
-        # Add specific mappings for country names
-        special_mappings = {
-            "BOSNIA & HERZEGOVINA": "BOSNIA AND HERZEGOVINA"
-        }
-        return special_mappings.get(country_name, unidecode(country_name.strip().upper()))
+        self.expected_countries = set()
+        self.regimes = {}
+        self.section_titles = set()
+        self.titles_found = set()
 
-    # Retrieve the expected country names from the database
+    # Retrieve the expected country names: the names of the database countries and their known aliases
     def get_expected_countries(self):
-        expected_countries = set()
         try:
-            cnx = pyodbc.connect(self.conn_str)
-            cursor = cnx.cursor()
-            cursor.execute("SELECT [COUNTRY_NAME_ENG] FROM TblSanctionsMap")
-            for row in cursor.fetchall():
-                expected_countries.add(self.normalize_country_name(row[0]))
-            cursor.close()
-            cnx.close()
+            return self.get_context().country_resolver().known_names()
         except Exception as e:
             logging.error(f"Error retrieving expected countries: {e}")
-        return expected_countries
+            return set()
+
+    # Path of the file caching the discovered regimes
+    def regimes_cache_path(self):
+        return os.path.join(get_http_cache().directory, 'eu_regimes.json')
 
-    # Parse the PDF from the given URL and extract the text
-    def parse_pdf(self, url):
-        response = requests.get(url)
+    # Load the cached regimes ({regime_id: title}), or None if they are missing or too old
+    def load_cached_regimes(self):
+        try:
+            with open(self.regimes_cache_path(), 'r', encoding='utf-8') as regimes_file:
+                cached = json.load(regimes_file)
+            discovered_at = datetime.datetime.fromisoformat(cached['discovered_at'])
+            if datetime.datetime.now() - discovered_at > REGIME_DISCOVERY_MAX_AGE:
+                return None
+            return {int(regime_id): title for regime_id, title in cached['regimes'].items()}
+        except (OSError, ValueError, KeyError):
+            return None
+
+    # Save the discovered regimes for the next runs
+    def save_cached_regimes(self, regimes):
+        os.makedirs(os.path.dirname(self.regimes_cache_path()), exist_ok=True)
+        with open(self.regimes_cache_path(), 'w', encoding='utf-8') as regimes_file:
+            json.dump({
+                'discovered_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                'regimes': regimes,
+            }, regimes_file, ensure_ascii=False, indent=2)
+
+    # Read the live regimes ({regime_id: title}) from the Sanctions Map API, or None if the list is unavailable
+    def discover_regimes(self):
+        try:
+            response = get_http_cache().get(REGIMES_URL)
+            if response.status_code != 200:
+                return None
+            data = json.loads(response.content)
+            items = data.get('data', []) if isinstance(data, dict) else data
+            regimes = {}
+            for item in items:
+                title = item.get('title') or item.get('name')
+                regimes[int(item['id'])] = title if isinstance(title, str) else None
+            return regimes or None
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logging.warning(f"Could not read the EU sanctions regime list: {e}")
+            return None
+
+    # Check whether a regime id exists with a HEAD request, or through the HTTP cache when the host refuses HEAD.
+    # Probes are not documents of the source, so they are left out of its fingerprint
+    def regime_exists(self, regime_id):
+        url = REGIME_PDF_URL.format(f"id[]={regime_id}")
+        response = self.http_head(url)
+        if response.status_code in (405, 501):
+            response = get_http_cache().get(url)
+        return response.status_code == 200
+
+    # Probe every regime id one at a time and keep those that exist, when the regime list is unavailable
+    def probe_regimes(self):
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            exists = list(executor.map(self.regime_exists, PROBED_REGIME_IDS))
+        return {regime_id: None for regime_id, regime_exists in zip(PROBED_REGIME_IDS, exists) if regime_exists}
+
+    # Return the live regimes, discovered once and cached for REGIME_DISCOVERY_MAX_AGE
+    def get_live_regimes(self):
+        regimes = self.load_cached_regimes()
+        if regimes is None:
+            regimes = self.discover_regimes() or self.probe_regimes()
+            if regimes:
+                self.save_cached_regimes(regimes)
+                logging.info(f"Discovered {len(regimes)} live EU sanctions regimes.")
+        return regimes
+
+    # Download one combined PDF holding the given regimes, or None if the request failed
+    def fetch_regimes(self, regime_ids):
+        url = REGIME_PDF_URL.format('&'.join(f"id[]={regime_id}" for regime_id in regime_ids))
+        response = self.http_get(url)
         if response.status_code == 200:
-            pdf_file = BytesIO(response.content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            for page_num in range(len(pdf_reader.pages)):
-                text += pdf_reader.pages[page_num].extract_text()
-            return text
+            return response.content
+        return None
+
+    # Fetch stage: download the live regimes in batches, each batch being one combined PDF, concurrently
+    def fetch(self):
+        regimes = self.get_live_regimes()
+        if not regimes:
+            logging.error("No EU sanctions regime found.")
+            return {}
+
+        # Regime titles delimit the regime sections inside a combined PDF
+        self.regimes = regimes
+
+        regime_ids = sorted(regimes)
+        batches = [tuple(regime_ids[i:i + BATCH_SIZE]) for i in range(0, len(regime_ids), BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            contents = executor.map(self.fetch_regimes, batches)
+            documents = {batch: content for batch, content in zip(batches, contents) if content is not None}
+
+        # A missing batch would leave its regimes out of the flags, and their countries would be planned to NO:
+        # nothing is planned from a partial set of documents, and the partial fingerprint is never marked as applied
+        if len(documents) < len(batches):
+            logging.error(f"{len(batches) - len(documents)} of {len(batches)} EU sanctions batches could not be downloaded, "
+                          f"no changes planned.")
+            self.fingerprint = {}
+            return {}
+        logging.info(f"Downloaded {len(regime_ids)} EU sanctions regimes in {len(batches)} requests.")
+        return documents
+
+    # Yield the lines of a downloaded PDF page by page; pages after the last line consumed are never extracted
+    def iter_pdf_lines(self, content):
+        pdf_reader = PyPDF2.PdfReader(BytesIO(content))
+        for page in pdf_reader.pages:
+            text = page.extract_text()
+            if text:
+                yield from text.split("\n")
+
+    # Return the regime title ending with the last lines read, a title being wrapped on up to MAX_TITLE_LINES lines
+    def section_title(self, recent_lines):
+        words = ''
+        for line in reversed(recent_lines):
+            words = f"{line} {words}".strip()
+            if words in self.section_titles:
+                return words
         return None
 
-    # Extract the country names and sanctions information from the text
-    def extract_country_and_sanctions(self, text):
+    # Extract the country names and sanctions information from a stream of lines.
+    # A combined PDF holds several regimes: a regime title or the end of a measures section resets the current country,
+    # so that the measures of one regime are never given to a country of the previous one. The end of a measures section
+    # cannot stop the reading, as the next regimes follow; with skip_after_measures, the lines after it are skipped up
+    # to the next regime title.
+    def extract_country_and_sanctions(self, lines, combined=False, skip_after_measures=False):
         updates = {}
-        lines = text.split("\n")
         current_country = None
+        in_measures = True
+        recent_lines = deque(maxlen=MAX_TITLE_LINES)
+        self.titles_found = set()
 
         for line in lines:
-            line = self.normalize_country_name(line)
+            line = normalize_country_name(line)
+            title = None
+            if self.section_titles and title_key(line):
+                recent_lines.append(title_key(line))
+                title = self.section_title(recent_lines)
+                if title:
+                    self.titles_found.add(title)
+            if not in_measures:
+                if title:
+                    in_measures = True
+                continue
             if line in self.expected_countries:
                 current_country = line
                 if current_country not in updates:
                     updates[current_country] = {db_column: 'NO' for db_column in self.measures_dict.values()}
+            elif title:
+                current_country = None
+            elif current_country and END_OF_MEASURES_PATTERN.match(line):
+                if not combined:
+                    break
+                current_country = None
+                in_measures = not skip_after_measures
             elif current_country:
                 for pattern, db_column in self.measures_dict.items():
                     if re.search(pattern, line):
@@ -103,186 +279,139 @@ class EUSanctionsUpdater:
 
         return updates
 
-    # Update the database with sanctions data
-    def update_database_EUsanctions(self, updates, urls_parsed=None):
-        changes_yes_to_no = []
-        changes_no_to_yes = []
-
-        if urls_parsed is None:
-            urls_parsed = {}
-
-        try:
-            # Connect to the database
-            cnx = pyodbc.connect(self.conn_str)
-            cursor = cnx.cursor()
-
-            # Prepare dictionaries for tracking updates
-            yes_update_data = {}  # Stores countries that need to be set to YES for each column
-            columns_to_update = set()  # Set of columns to update
-
-            # Step 1: Collect the "YES" updates and track which countries are being updated
-            logging.info("Collecting 'YES' updates for sanctions...")
-            for country_name, sanctions in updates.items():
-                normalized_country_name = self.normalize_country_name(country_name)
-                cursor.execute("SELECT 1 FROM TblSanctionsMap WHERE REPLACE([COUNTRY_NAME_ENG], '’', '''') = ?",
-                               normalized_country_name)
-                result = cursor.fetchone()
+    # Parse stage: merge the sanctions of every regime, a measure being YES if any regime imposes it
+    def parse(self, documents):
+        self.expected_countries = self.get_expected_countries()
 
-                if result:
+        # Parse the documents in parallel; results come back in regime order, so the merge is deterministic
+        batches = sorted(documents)
+        arguments = [(documents[batch], self.expected_countries, [self.regimes.get(regime_id) for regime_id in batch],
+                      len(batch) > 1) for batch in batches]
+        if PARSE_WORKERS > 1 and len(arguments) > 1:
+            with ProcessPoolExecutor(max_workers=min(PARSE_WORKERS, len(arguments)), mp_context=PARSE_CONTEXT) as executor:
+                regime_updates = list(executor.map(parse_regime, *zip(*arguments)))
+        else:
+            regime_updates = [parse_regime(*regime_arguments) for regime_arguments in arguments]
+
+        # Countries are merged on their SanctionsMapId, so that a country listed under an alias is merged with itself
+        all_updates = {}
+        country_names = {}
+        for updates in regime_updates:
+            for country, sanctions in updates.items():
+                key = self.flag_key(country) or country
+                country_names.setdefault(key, country)
+                if key in all_updates:
                     for db_column, status in sanctions.items():
-                        if status == "YES":
-                            if db_column not in yes_update_data:
-                                yes_update_data[db_column] = []
-                            yes_update_data[db_column].append(normalized_country_name)
-                            columns_to_update.add(db_column)
+                        if status == 'YES':
+                            all_updates[key][db_column] = 'YES'
                 else:
-                    logging.warning(f"Country {normalized_country_name} not found in the database.")
-
-            # Step 2: Update all relevant countries to 'YES' for each sanctions column
-            logging.info("Updating countries to 'YES' for sanctions...")
-            for db_column, country_names in yes_update_data.items():
-                if country_names:
-                    placeholders = ', '.join(['?'] * len(country_names))
-                    bulk_yes_update_query = f"""
-                        UPDATE TblSanctionsMap
-                        SET [{db_column}] = 'YES'
-                        WHERE REPLACE([COUNTRY_NAME_ENG], '’', '''') IN ({placeholders})
-                    """
-                    cursor.execute(bulk_yes_update_query, tuple(country_names))
-                    logging.info(f"Updated {len(country_names)} countries to 'YES' for {db_column}.")
-                    cnx.commit()
-
-            # Step 3: Set remaining countries to 'NO' and track changes
-            logging.info("Setting remaining countries to 'NO' and tracking changes...")
-            for db_column in columns_to_update:
-                cursor.execute(f"""
-                    SELECT [COUNTRY_NAME_ENG], [{db_column}]
-                    FROM TblSanctionsMap
-                    WHERE [{db_column}] = 'YES'
-                """)
-                countries_in_yes = cursor.fetchall()
-
-                for row in countries_in_yes:
-                    country_name, current_status = row
-                    if country_name not in yes_update_data.get(db_column, []):
-                        # Track change from YES to NO
-                        changes_yes_to_no.append((country_name, db_column, 'YES', 'NO'))
-
-                        # Update to NO
-                        cursor.execute(f"""
-                            UPDATE TblSanctionsMap
-                            SET [{db_column}] = 'NO'
-                            WHERE [COUNTRY_NAME_ENG] = ?
-                        """, country_name)
-                        logging.info(f"Set {country_name} to 'NO' for {db_column}.")
-
-                cnx.commit()
-
-            # Step 4: Log changes from NO to YES
-            logging.info("Tracking changes from NO to YES...")
-            for country_name, sanctions in updates.items():
-                normalized_country_name = self.normalize_country_name(country_name)
-                for db_column, new_status in sanctions.items():
-                    cursor.execute(f"""
-                        SELECT [{db_column}] FROM TblSanctionsMap
-                        WHERE REPLACE([COUNTRY_NAME_ENG], '’', '''') = ?
-                    """, normalized_country_name)
-                    old_status = cursor.fetchone()[0]
-
-                    # Track changes from NO to YES
-                    if old_status == 'NO' and new_status == 'YES':
-                        changes_no_to_yes.append((normalized_country_name, db_column, 'NO', 'YES'))
-
-            # Commit all changes at once
-            logging.info("Database updated successfully.")
-
-            # Step 5: Log the sanctions found for each country per URL
-            if urls_parsed:
-                logging.info("Sanctions parsed from each URL:")
-                for url, countries_data in urls_parsed.items():
-                    logging.info(f"URL: {url}")
-                    for country, sanctions in countries_data.items():
-                        sanctions_found = [f"{db_column}: {status}" for db_column, status in sanctions.items()]
-                        logging.info(f"Country: {country}, Sanctions: {', '.join(sanctions_found)}")
-
-        except Exception as e:
-            logging.error(f"Error updating SQL database: {e}")
-        finally:
-            # Ensure cursor and connection are properly closed
-            cursor.close()
-            cnx.close()
-
-        # Log the countries that switched from YES to NO
-        if changes_yes_to_no:
-            logging.info("Countries switched from YES to NO:")
-            for change in changes_yes_to_no:
-                logging.info(f"Country: {change[0]}, Column: {change[1]}, Change: {change[2]} -> {change[3]}")
+                    all_updates[key] = dict(sanctions)
 
-        # Log the countries that switched from NO to YES
-        if changes_no_to_yes:
-            logging.info("Countries switched from NO to YES:")
-            for change in changes_no_to_yes:
-                logging.info(f"Country: {change[0]}, Column: {change[1]}, Change: {change[2]} -> {change[3]}")
+        return [CountryFlag(country_names[key], db_column, status)
+                for key, sanctions in all_updates.items()
+                for db_column, status in sanctions.items()]
 
-        return changes_yes_to_no, changes_no_to_yes
 
-    # Check for changes in the database for EU sanctions
-    def check_database_changes_EUsanctions(self, updates):
-        changes = []
-        try:
-            cnx = pyodbc.connect(self.conn_str)
+# Extract the sanctions of every expected country from the lines of a regime PDF, or a combined one, given the titles of
+# its regimes; read_lines returns the lines for the updater parsing them. The lines after a measures section are only skipped when the title of every regime is known; if one of
+# them is not found in the document, it is read again without skipping any line, so that no regime is lost.
+def parse_regime_lines(read_lines, expected_countries, titles, combined):
+    updater = EUSanctionsUpdater(database)
+    updater.expected_countries = expected_countries
+    updater.section_titles = {title_key(title) for title in titles if isinstance(title, str) and title_key(title)}
+    skip_after_measures = combined and len(updater.section_titles) == len(titles)
+
+    updates = updater.extract_country_and_sanctions(read_lines(updater), combined, skip_after_measures)
+    if skip_after_measures and updater.titles_found != updater.section_titles:
+        logging.warning(f"{len(updater.section_titles - updater.titles_found)} regime titles not found in a combined "
+                        f"EU sanctions PDF, reading it again without skipping the lines after the measures.")
+        updates = updater.extract_country_and_sanctions(read_lines(updater), combined)
+    return updates
+
+
+# Extract the sanctions of every expected country from a regime PDF, or a combined one; runs in a worker process
+def parse_regime(content, expected_countries, titles, combined):
+    return parse_regime_lines(lambda updater: updater.iter_pdf_lines(content), expected_countries, titles, combined)
+
+
+# Parse the excerpts of combined PDFs with the regime titles known, unknown and wrapped or reworded in the document,
+# and check that every regime gives the recorded flags
+def check_combined_pdf(fixture_dir=FIXTURE_DIR):
+    cases = [
+        ('combined.txt', FIXTURE_TITLES, 'regime titles known'),
+        ('combined.txt', [None] * len(FIXTURE_TITLES), 'regime titles unknown'),
+        ('combined.txt', FIXTURE_TITLES[:1] + [None] + FIXTURE_TITLES[2:], 'one regime title unknown'),
+        ('combined_wrapped.txt', FIXTURE_TITLES, 'regime titles wrapped in the document'),
+        ('combined.txt', FIXTURE_TITLES[:2] + ['Belarus: sectoral sanctions'], 'regime title reworded in the document'),
+    ]
+    for file_name, titles, case in cases:
+        with open(os.path.join(fixture_dir, file_name), 'r', encoding='utf-8') as fixture_file:
+            lines = fixture_file.read().splitlines()
+        updates = parse_regime_lines(lambda updater: iter(lines), set(FIXTURE_UPDATES), titles, True)
+        assert updates == FIXTURE_UPDATES, f"{file_name}, {case}: parsed {updates}, expected {FIXTURE_UPDATES}"
+        logging.info(f"{file_name}, {case}: the {len(FIXTURE_UPDATES)} regimes give the recorded flags.")
+
+# Number of statements the former update_database_EUsanctions and check_database_changes_EUsanctions sent for the
+# same flags: an existence SELECT per country, a status SELECT per country and column in both methods,
+# then per column one YES update, one SELECT and one UPDATE per stale country
+def legacy_statement_count(flags, snapshot):
+    updates = {}
+    for flag in flags:
+        updates.setdefault(normalize_country_name(flag.country), {})[flag.column] = flag.value
+    names = {normalize_country_name(row['COUNTRY_NAME_ENG']) for row in snapshot}
+    found = [country for country in updates if country in names]
+
+    yes_countries = {}
+    for country in found:
+        for column, status in updates[country].items():
+            if status == 'YES':
+                yes_countries.setdefault(column, set()).add(country)
+    stale = sum(1 for column, countries in yes_countries.items()
+                for row in snapshot
+                if row.get(column) == 'YES' and normalize_country_name(row['COUNTRY_NAME_ENG']) not in countries)
+
+    update_statements = len(updates) + 2 * len(yes_countries) + stale + sum(len(sanctions) for sanctions in updates.values())
+    check_statements = len(updates) + sum(len(updates[country]) for country in found)
+    return update_statements + check_statements
+
+
+# Count the statements of a full EU run (snapshot read, plan and set-based apply) against the former per-country queries.
+# The changes are applied in a transaction that is rolled back when the connection returns to the pool.
+def benchmark_statements():
+    updater = EUSanctionsUpdater(database)
+    context = updater.get_context()
+    try:
+        flags = updater.fetch_and_parse(force=True)
+        get_http_cache().flush()
+        snapshot = context.snapshot()
+        plan = updater.plan(flags, snapshot)
+        with context.pool.connection() as cnx:
             cursor = cnx.cursor()
-
-            # Fetch the current status from the database for each measure
-            for country_name, sanctions in updates.items():
-                normalized_country_name = self.normalize_country_name(country_name)
-                cursor.execute("SELECT 1 FROM TblSanctionsMap WHERE REPLACE([COUNTRY_NAME_ENG], '’', '''') = ?", normalized_country_name)
-                result = cursor.fetchone()
-                if result:
-                    for db_column, new_status in sanctions.items():
-                        cursor.execute(f"SELECT [{db_column}] FROM TblSanctionsMap WHERE REPLACE([COUNTRY_NAME_ENG], '’', '''') = ?", normalized_country_name)
-                        old_status = cursor.fetchone()[0]
-                        if old_status != new_status:
-                            changes.append((normalized_country_name, db_column, old_status, new_status))
-                            if new_status.upper() == 'YES':
-                                logging.info(f"Country: {normalized_country_name}, Column: {db_column}, Old Status: {old_status}, New Status: {new_status}")
-
+            plan.apply(cursor)
             cursor.close()
-            cnx.close()
-        except Exception as e:
-            logging.error(f"Error checking database changes: {e}")
-        return changes
+
+        statements = context.pool.statements.count
+        legacy_statements = legacy_statement_count(flags, snapshot)
+        logging.info(f"EU sanctions: {len(plan)} changes planned for {len({flag.country for flag in flags})} countries.")
+        logging.info(f"Statements sent: {statements} (former per-country queries: {legacy_statements}, "
+                     f"{legacy_statements - statements} removed).")
+    finally:
+        context.close()
 
 def main():
 
-    regime_ids = range(1, 71)
+    if '--check-combined' in sys.argv[1:]:
+        check_combined_pdf()
+        return
+
+    if '--benchmark-statements' in sys.argv[1:]:
+        benchmark_statements()
+        return
 
     updater = EUSanctionsUpdater(database)
 
     try:
-        all_updates = {}
-        for regime_id in regime_ids:
-            url = f"https://www.sanctionsmap.eu/api/v1/pdf/regime?id[]={regime_id}&lang=en"
-            pdf_text = updater.parse_pdf(url)
-            if pdf_text:
-                updates = updater.extract_country_and_sanctions(pdf_text)
-                for country, sanctions in updates.items():
-                    normalized_country_name = updater.normalize_country_name(country)
-                    if normalized_country_name in all_updates:
-                        for db_column, status in sanctions.items():
-                            if status == 'YES':
-                                all_updates[normalized_country_name][db_column] = 'YES'
-                    else:
-                        all_updates[normalized_country_name] = sanctions
-
-        logging.info("Checking for database changes...")
-        changes = updater.check_database_changes_EUsanctions(all_updates)
-        if changes:
-            logging.info(f"Changes detected: {changes}")
-
-        logging.info("Updating the database with new EU sanctions data...")
-        updater.update_database_EUsanctions(all_updates)
-
+        updater.run()
     except Exception as e:
         logging.error(f"Error during update: {e}")
 
@@ -1,20 +1,24 @@
 """
-This script fetches the OFAC sanctions list from the OFAC website and updates the database with the new data.
-It also provides a summary of countries with 'YES' status in the OFAC Sanction Program.
+This script fetches the OFAC SDN list, as SDN.CSV or as the advanced XML export (OFAC_MODE=xml), and updates the
+US_OFAC_SANCTIONS column from the countries of its entities, which are stored by UID in Logic/EntityStore.py.
+It also writes the name-screening index of the SDN names and provides a summary of the countries with 'YES' status.
+Run with --check-xml to compare both modes on the recorded excerpt of fixtures/ofac.
 """
 
 # Import necessary libraries
 import os
+import sys
 import dotenv
 import requests
 import csv
-from unidecode import unidecode
-import pyodbc
+import xml.etree.ElementTree as ElementTree
 import logging
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
 import re
-from Logic.ComputedLogic import get_sanctions_map_columns_sql
+from Logic.Updater import BaseUpdater, CountryFlag
+from Logic.CountryResolver import normalize_country_name
+from Logic.EntityStore import (SdnEntity, CREATE_TABLES_SQL, load_entity_hashes, diff_entities, apply_entity_diff,
+                               refresh_country_flag)
+from Logic.ScreeningIndex import build_index
 
 # Load environment variables from .env file
 dotenv.load_dotenv()
@@ -28,10 +32,73 @@ database = os.getenv('DATABASE')
 uid = os.getenv('UID')
 pwd = os.getenv('PWD')
 
+# Source of the SDN list: 'csv' for SDN.CSV, 'xml' for the advanced XML export
+OFAC_MODE = os.getenv('OFAC_MODE', 'csv').lower()
+
+# Optional local copy of the advanced XML export
+OFAC_SDN_ADVANCED_FILE = os.getenv('OFAC_SDN_ADVANCED_FILE')
+
+# Name-screening index built from the SDN entities
+OFAC_SCREENING_INDEX = os.getenv('OFAC_SCREENING_INDEX', 'ofac_screening.idx')
+
+SDN_CSV_URL = 'https://sanctionslistservice.ofac.treas.gov/api/PublicationPreview/exports/SDN.CSV'
+SDN_ADVANCED_URL = 'https://sanctionslistservice.ofac.treas.gov/api/PublicationPreview/exports/SDN_ADVANCED.XML'
+
+# Separators between the country names of the SDN address column
+COUNTRY_SEPARATOR_PATTERN = re.compile(r'[;\s]\s*')
+
+# Empty cells of SDN.CSV
+SDN_CSV_NULL = '-0-'
+
+# Separators between the programs of an SDN.CSV row, such as "SDGT] [IRGC"
+PROGRAM_SEPARATOR_PATTERN = re.compile(r'\]\s*\[')
+
+# Aliases listed in the remarks column of SDN.CSV
+ALIAS_PATTERN = re.compile(r"a\.k\.a\.\s*'([^']+)'", re.IGNORECASE)
+
+# SDN.CSV leaves the type of the entities empty, and names the other parties in lower case
+CSV_EMPTY_ENTITY_TYPE = 'entity'
+
+# Recorded excerpt of the advanced XML export, with the SDN.CSV rows of the same entries, read by --check-xml
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures', 'ofac')
+
+# Programs of every country of the recorded excerpt
+FIXTURE_COUNTRY_PROGRAMS = {
+    'CUBA': {'CUBA'},
+    'IRAN': {'IFSR', 'IRAN', 'SDGT'},
+    'RUSSIA': {'RUSSIA-EO14024'},
+    'SYRIA': {'SYRIA'},
+}
+
+
+# Return the tag of an XML element without its namespace
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+# Return the SDN.CSV type of a party from its PartySubTypeID: the subtype name, such as Vessel, or the name of its party
+# type, such as Individual, when the subtype is Unknown
+def entity_type_name(sub_type_id, party_sub_types, party_types):
+    if sub_type_id not in party_sub_types:
+        return ''
+    party_type_id, sub_type_name = party_sub_types[sub_type_id]
+    type_name = party_types.get(party_type_id, '') if sub_type_name.upper() == 'UNKNOWN' else sub_type_name
+    type_name = type_name.lower()
+    return '' if type_name == CSV_EMPTY_ENTITY_TYPE else type_name
+
+
+class OFACUpdater(BaseUpdater):
+
+    source = 'OFAC'
+    columns = ['US_OFAC_SANCTIONS']
+    column_type = 'NVARCHAR(50)'
 
-class OFACUpdater:
     def __init__(self, db_name):
         self.db_name = db_name
+        self.country_programs = {}
+        self.screening_entries = []
+        self.entities = {}
+        self.entity_diff = None
         self.conn_str = (
             f'DRIVER={{SQL Server}};'
             f'SERVER={server};'
@@ -40,128 +107,244 @@ class OFACUpdater:
             f'PWD={pwd}'
         )
 
-    def normalize_country_name(self, name):
-        normalized_name = unidecode(name.strip().upper().replace(' ', ''))
-        return self.map_special_countries(normalized_name)
-
-    def map_special_countries(self, name):
-        # Add specific mappings for country names
-        country_mappings = {
-            "DPRK": "DEMOCRATIC PEOPLE'S REPUBLIC OF KOREA (DPRK - NORTH KOREA)",
-            "BURMA": "MYANMAR (BURMA)"
-        }
-        return country_mappings.get(name, name)
-
-    def parse_csv(self, url):
-        session = requests.Session()
-        retry = Retry(total=5, read=5, connect=5, backoff_factor=0.3, status_forcelist=(500, 502, 504))
-        adapter = HTTPAdapter(max_retries=retry)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
+    # Fetch stage: open a stream on the SDN list; the body is read by the parse stage
+    def fetch(self):
+        if OFAC_MODE == 'xml' and OFAC_SDN_ADVANCED_FILE:
+            logging.info(f"Reading the OFAC advanced XML export from {OFAC_SDN_ADVANCED_FILE}")
+            return OFAC_SDN_ADVANCED_FILE
 
+        url = SDN_ADVANCED_URL if OFAC_MODE == 'xml' else SDN_CSV_URL
         try:
-            response = session.get(url)
+            response = self.http_stream(url)
             response.raise_for_status()
-            decoded_content = response.content.decode('utf-8')
-            csv_reader = csv.reader(decoded_content.splitlines(), delimiter=',')
-            next(csv_reader)  # Skip header row
-            countries = set()
-
-            for row in csv_reader:
-                if len(row) > 11:
-                    cell_content = row[11].strip().upper()
-                    if cell_content:
-                        country_names = re.split(r'[;\s]\s*', cell_content)
-                        for name in country_names:
-                            normalized_country = self.normalize_country_name(name)
-                            if normalized_country:
-                                countries.add(normalized_country)
-
-            return countries
+            return response
         except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching CSV file from {url}: {e}")
+            logging.error(f"Error fetching SDN list from {url}: {e}")
             return None
 
-    def collect_updates(self, csv_url):
-        return self.parse_csv(csv_url)
+    # Return the value of an SDN.CSV cell, empty for the null marker
+    def csv_value(self, row, index):
+        value = row[index].strip() if len(row) > index else ''
+        return '' if value == SDN_CSV_NULL else value
+
+    # Read the countries of the SDN list from downloaded bytes or from a stream, one row at a time
+    def parse_csv(self, content):
+        lines = content.decode('utf-8').splitlines() if isinstance(content, bytes) else content.text('utf-8')
+        csv_reader = csv.reader(lines, delimiter=',')
+        countries = set()
+
+        # SDN.CSV has no header row: every row starting with a UID is an entry
+        for row in csv_reader:
+            if not row or not row[0].strip().isdigit():
+                continue
+            row_countries = set()
+            if len(row) > 11:
+                cell_content = row[11].strip().upper()
+                if cell_content:
+                    country_names = COUNTRY_SEPARATOR_PATTERN.split(cell_content)
+                    for name in country_names:
+                        normalized_country = normalize_country_name(name)
+                        if normalized_country:
+                            row_countries.add(normalized_country)
+                countries.update(row_countries)
+
+            if len(row) > 1:
+                entity_id = int(row[0])
+                self.screening_entries.append((entity_id, row[1]))
+                self.screening_entries.extend((entity_id, alias) for alias in ALIAS_PATTERN.findall(self.csv_value(row, 11)))
+                programs = PROGRAM_SEPARATOR_PATTERN.split(self.csv_value(row, 3).strip('[]'))
+                self.entities[entity_id] = SdnEntity(
+                    entity_id, self.csv_value(row, 1), self.csv_value(row, 2),
+                    tuple(sorted(program.strip() for program in programs if program.strip())),
+                    self.csv_value(row, 11), tuple(sorted(row_countries)),
+                )
+
+        return countries
+
+    # Read the sanctions programs of every country from the advanced XML export, given as a file path or a stream.
+    # Elements are removed from the tree as soon as they are processed, so memory stays bounded by the lookup tables.
+    def parse_advanced_xml(self, content):
+        source = content if isinstance(content, str) else content.raw()
+        country_names = {}          # Country ID -> country name
+        program_type_ids = set()    # SanctionsType IDs of the program measures
+        party_sub_types = {}        # PartySubType ID -> (PartyType ID, subtype name)
+        party_types = {}            # PartyType ID -> party type name
+        location_countries = {}     # Location ID -> Country IDs
+        profile_locations = {}      # Profile ID -> Location IDs
+        country_programs = {}       # Country name -> program names
+        profile_entities = {}       # Profile ID -> entity fields
+
+        stack = []
+        for event, element in ElementTree.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                stack.append(element)
+                continue
+
+            stack.pop()
+            name = local_name(element.tag)
+            parent_name = local_name(stack[-1].tag) if stack else None
+            processed = True
+
+            if name == 'Country' and parent_name == 'CountryValues':
+                country_names[element.get('ID')] = normalize_country_name(element.text or '')
+            elif name == 'SanctionsType' and parent_name == 'SanctionsTypeValues':
+                if (element.text or '').strip().upper() == 'PROGRAM':
+                    program_type_ids.add(element.get('ID'))
+            elif name == 'PartySubType' and parent_name == 'PartySubTypeValues':
+                party_sub_types[element.get('ID')] = (element.get('PartyTypeID'), (element.text or '').strip())
+            elif name == 'PartyType' and parent_name == 'PartyTypeValues':
+                party_types[element.get('ID')] = (element.text or '').strip()
+            elif name == 'Location':
+                location_countries[element.get('ID')] = [child.get('CountryID') for child in element.iter()
+                                                         if local_name(child.tag) == 'LocationCountry']
+            elif name == 'DistinctParty':
+                # Primary names and aliases alike, each documented name being the concatenation of its parts
+                entity_id = int(element.get('FixedRef'))
+                names = []
+                for documented_name in element.iter():
+                    if local_name(documented_name.tag) == 'DocumentedName':
+                        parts = [(part.text or '').strip() for part in documented_name.iter()
+                                 if local_name(part.tag) == 'NamePartValue']
+                        names.append(' '.join(part for part in parts if part))
+                self.screening_entries.extend((entity_id, name) for name in names)
+                for profile in element.iter():
+                    if local_name(profile.tag) == 'Profile':
+                        profile_locations[profile.get('ID')] = {child.get('LocationID') for child in profile.iter()
+                                                                if local_name(child.tag) == 'VersionLocation'}
+                        profile_entities[profile.get('ID')] = {
+                            'uid': entity_id,
+                            'name': names[0] if names else '',
+                            'sub_type_id': profile.get('PartySubTypeID'),
+                            'programs': set(),
+                        }
+            elif name == 'SanctionsEntry':
+                programs = {(measure.findtext('{*}Comment') or '').strip()
+                            for measure in element.iter()
+                            if local_name(measure.tag) == 'SanctionsMeasure' and measure.get('SanctionsTypeID') in program_type_ids}
+                programs.discard('')
+                if element.get('ProfileID') in profile_entities:
+                    profile_entities[element.get('ProfileID')]['programs'].update(programs)
+                for location_id in profile_locations.get(element.get('ProfileID'), ()):
+                    for country_id in location_countries.get(location_id, ()):
+                        country = country_names.get(country_id)
+                        if country:
+                            country_programs.setdefault(country, set()).update(programs)
+            else:
+                processed = False
+
+            # Drop the processed elements and every completed item of a top-level section, used or not,
+            # so that the tree never holds more than the item being built
+            if processed or len(stack) <= 2:
+                element.clear()
+                if stack:
+                    stack[-1].remove(element)
+
+        for profile_id, fields in profile_entities.items():
+            entity_countries = {country_names.get(country_id)
+                                for location_id in profile_locations.get(profile_id, ())
+                                for country_id in location_countries.get(location_id, ())}
+            entity_countries.discard(None)
+            entity_type = entity_type_name(fields['sub_type_id'], party_sub_types, party_types)
+            self.entities[fields['uid']] = SdnEntity(fields['uid'], fields['name'], entity_type,
+                                                     tuple(sorted(fields['programs'])), '', tuple(sorted(entity_countries)))
+
+        return country_programs
+
+    # Parse stage: flag every country found in the SDN list
+    def parse(self, content):
+        if not content:
+            logging.error("No OFAC sanctioned countries found or failed to parse the SDN list.")
+            return []
 
-    def update_database_OFAC(self, csv_countries):
+        if OFAC_MODE == 'xml':
+            self.country_programs = self.parse_advanced_xml(content)
+            for country, programs in sorted(self.country_programs.items()):
+                logging.info(f"OFAC programs for {country}: {', '.join(sorted(programs))}")
+            countries = set(self.country_programs)
+        else:
+            countries = self.parse_csv(content)
+
+        # The remarks column is split on every space, so most of its tokens (dates, numbers, names) are no country:
+        # only the tokens resolving to a table row are flagged, the others are dropped without a warning
+        resolved_countries = {country for country in countries if self.flag_key(country) is not None}
+        logging.info(f"{len(countries) - len(resolved_countries)} SDN tokens matching no country were ignored.")
+        countries = resolved_countries
+
+        self.build_screening_index()
+        logging.info(f"\nOFAC sanctioned countries found: {', '.join(sorted(countries))}")
+        return [CountryFlag(country, 'US_OFAC_SANCTIONS', 'YES') for country in sorted(countries)]
+
+    # Plan stage: plan the flag changes, and diff the parsed entities against the stored ones
+    def plan(self, flags, snapshot):
+        plan = super().plan(flags, snapshot)
+        self.entity_diff = None
+        if not self.entities:
+            return plan
+
+        # Entities keep the SanctionsMapId of their countries, so adding a country to the table amends the entities naming it
+        entities = {}
+        for uid, entity in self.entities.items():
+            countries = {self.flag_key(country) for country in entity.countries}
+            countries.discard(None)
+            entities[uid] = entity._replace(countries=tuple(sorted(countries)))
+
+        with self.get_context().pool.connection() as cnx:
+            cursor = cnx.cursor()
+            stored_hashes = load_entity_hashes(cursor)
+            cursor.close()
+        self.entity_diff = diff_entities(entities, stored_hashes)
+        logging.info(f"{self.source}: {len(self.entity_diff.added)} entities added, {len(self.entity_diff.amended)} amended, "
+                     f"{len(self.entity_diff.removed)} removed since the last ingested list.")
+        return plan
+
+    # The entity tables are created by the SchemaGuard before the apply stage
+    def table_definitions(self):
+        return [CREATE_TABLES_SQL]
+
+    # The entity changes are written even when no flag changes
+    def has_pending_writes(self):
+        return bool(self.entity_diff and any(self.entity_diff))
+
+    # Apply stage: write the entity changes, then derive the flags from the entities.
+    # A replayed plan has no entity diff and is applied cell by cell.
+    def apply(self, plan, cursor):
+        if self.entity_diff is None:
+            plan.apply(cursor)
+            return
+        apply_entity_diff(cursor, self.entity_diff)
+        refresh_country_flag(cursor, 'US_OFAC_SANCTIONS')
+
+    # Write the screening index of the names and aliases read by the parse stage
+    def build_screening_index(self):
+        if not self.screening_entries:
+            logging.warning("No SDN names found, the screening index was not rebuilt.")
+            return
         try:
-            # Connect to the database
-            with pyodbc.connect(self.conn_str) as cnx:
-                with cnx.cursor() as cursor:
-                    # Drop dependent computed columns before modifying the data
-                    logging.info("Dropping dependent computed columns (LEVEL_OF_RISK, LEVEL_OF_VIGILANCE, LIST)...")
-                    cursor.execute("""
-                        IF EXISTS (SELECT 1 FROM sys.columns WHERE name IN ('LEVEL_OF_RISK', 'LEVEL_OF_VIGILANCE', 'LIST') 
-                        AND object_id = OBJECT_ID('TblSanctionsMap'))
-                        BEGIN
-                            ALTER TABLE TblSanctionsMap 
-                            DROP COLUMN LEVEL_OF_RISK, LEVEL_OF_VIGILANCE, LIST;
-                        END
-                    """)
-                    cnx.commit()
-
-                    # Ensure the column can store the values properly
-                    logging.info("Ensuring column structure is correct...")
-                    cursor.execute("""
-                        ALTER TABLE TblSanctionsMap
-                        ALTER COLUMN [US_OFAC_SANCTIONS] NVARCHAR(50)
-                    """)
-                    cnx.commit()
-
-                    # Step 1: Set all countries to 'NO'
-                    logging.info("Setting all countries to 'NO'...")
-                    cursor.execute("""
-                        UPDATE TblSanctionsMap
-                        SET [US_OFAC_SANCTIONS] = 'NO'
-                    """)
-                    cnx.commit()
-
-                    # Step 2: Update only the parsed countries to 'YES'
-                    csv_countries_list = list(csv_countries)
-                    max_params = 2000  # Stay within SQL Server's parameter limit
-
-                    logging.info(f"Updating {len(csv_countries_list)} countries to 'YES' in batches...")
-
-                    for i in range(0, len(csv_countries_list), max_params):
-                        batch = csv_countries_list[i:i + max_params]
-                        placeholders = ', '.join(['?'] * len(batch))
-                        update_yes_query = f"""
-                            UPDATE TblSanctionsMap
-                            SET [US_OFAC_SANCTIONS] = 'YES'
-                            WHERE REPLACE([COUNTRY_NAME_ENG], '’', '''') IN ({placeholders})
-                        """
-                        cursor.execute(update_yes_query, tuple(batch))
-                        cnx.commit()
-
-                        logging.info(f"Updated {len(batch)} countries to 'YES' in this batch.")
-
-                    # Step 3: Recreate computed columns (LEVEL_OF_RISK, LEVEL_OF_VIGILANCE, LIST)
-                    logging.info("Recreating computed columns (LEVEL_OF_RISK, LEVEL_OF_VIGILANCE, LIST)...")
-                    cursor.execute(get_sanctions_map_columns_sql())
-                    cnx.commit()
-
-                    logging.info("Computed columns recreated successfully.")
-
-        except pyodbc.Error as e:
-            logging.error(f"Database error during OFAC updates: {e}")
-        except Exception as e:
-            logging.error(f"General error during OFAC updates: {e}")
+            build_index(self.screening_entries, OFAC_SCREENING_INDEX)
+        except OSError as e:
+            logging.error(f"Error writing the screening index to {OFAC_SCREENING_INDEX}: {e}")
+        self.screening_entries = []
+
+    # The SDN list is also parsed when the screening index is missing, even if the list did not change
+    def is_unchanged(self):
+        return super().is_unchanged() and os.path.exists(OFAC_SCREENING_INDEX)
+
+    # Return the countries of every sanctions program, as parsed from the advanced XML export
+    def get_programs_summary(self):
+        return countries_by_program(self.country_programs)
 
     def get_summary_of_yes_countries(self):
         try:
-            cnx = pyodbc.connect(self.conn_str)
-            cursor = cnx.cursor()
-            cursor.execute("""
-                SELECT [COUNTRY_NAME_ENG] 
-                FROM TblSanctionsMap 
-                WHERE [US_OFAC_SANCTIONS] = 'YES'
-            """)
-            yes_countries = cursor.fetchall()
-            yes_countries = [row[0] for row in yes_countries]
-            cursor.close()
-            cnx.close()
+            with self.get_context().pool.connection() as cnx:
+                cursor = cnx.cursor()
+                cursor.execute("""
+                    SELECT [COUNTRY_NAME_ENG]
+                    FROM TblSanctionsMap
+                    WHERE [US_OFAC_SANCTIONS] = 'YES'
+                """)
+                yes_countries = cursor.fetchall()
+                yes_countries = [row[0] for row in yes_countries]
+                cursor.close()
 
             return yes_countries
 
@@ -169,28 +352,73 @@ class OFACUpdater:
             logging.error(f"Error fetching summary of 'YES' countries: {e}")
             return []
 
+# Return the countries of every program from a mapping of the programs of every country
+def countries_by_program(country_programs):
+    programs = {}
+    for country, country_program_names in country_programs.items():
+        for program in country_program_names:
+            programs.setdefault(program, set()).add(country)
+    return {program: sorted(countries) for program, countries in sorted(programs.items())}
+
+
+# Parse the recorded excerpt with both paths and check the flags of the advanced XML export: the programs of every
+# country must be the recorded ones and those of the SDN.CSV entries naming the country, and so must the countries
+# of every program
+def check_advanced_xml(fixture_dir=FIXTURE_DIR):
+    xml_updater = OFACUpdater(database)
+    xml_updater.country_programs = xml_updater.parse_advanced_xml(os.path.join(fixture_dir, 'SDN_ADVANCED.XML'))
+
+    csv_updater = OFACUpdater(database)
+    with open(os.path.join(fixture_dir, 'SDN.CSV'), 'rb') as csv_file:
+        csv_countries = csv_updater.parse_csv(csv_file.read())
+
+    # The CSV path flags every country token of the remarks; the programs of a country are those of its entries
+    csv_country_programs = {}
+    for entity in csv_updater.entities.values():
+        for country in entity.countries:
+            if country in FIXTURE_COUNTRY_PROGRAMS:
+                csv_country_programs.setdefault(country, set()).update(entity.programs)
+
+    assert xml_updater.country_programs == FIXTURE_COUNTRY_PROGRAMS, \
+        f"XML programs by country {xml_updater.country_programs} differ from the recorded {FIXTURE_COUNTRY_PROGRAMS}"
+    assert set(FIXTURE_COUNTRY_PROGRAMS) <= csv_countries, \
+        f"Countries {sorted(set(FIXTURE_COUNTRY_PROGRAMS) - csv_countries)} are flagged by the XML path only"
+    assert csv_country_programs == xml_updater.country_programs, \
+        f"CSV programs by country {csv_country_programs} differ from the XML ones {xml_updater.country_programs}"
+    assert xml_updater.get_programs_summary() == countries_by_program(csv_country_programs), \
+        f"XML countries by program {xml_updater.get_programs_summary()} differ from the CSV ones"
+    assert set(xml_updater.entities) == set(csv_updater.entities), \
+        f"XML entities {sorted(xml_updater.entities)} differ from the CSV ones {sorted(csv_updater.entities)}"
+    xml_types = {uid: entity.entity_type for uid, entity in xml_updater.entities.items()}
+    csv_types = {uid: entity.entity_type for uid, entity in csv_updater.entities.items()}
+    assert xml_types == csv_types, f"XML entity types {xml_types} differ from the CSV ones {csv_types}"
+
+    for program, countries in xml_updater.get_programs_summary().items():
+        logging.info(f"OFAC program {program}: {', '.join(countries)}")
+    logging.info(f"The advanced XML export of {fixture_dir} gives the recorded flags of "
+                 f"{len(FIXTURE_COUNTRY_PROGRAMS)} countries, the same as SDN.CSV.")
+
+
 def main():
-    # Database name and CSV URL
 
-    csv_url = 'https://sanctionslistservice.ofac.treas.gov/api/PublicationPreview/exports/SDN.CSV'
+    if '--check-xml' in sys.argv[1:]:
+        check_advanced_xml()
+        return
 
     # Initialize the OFACUpdater
     updater = OFACUpdater(database)
 
-    # Collect updates for OFAC
-    csv_countries = updater.collect_updates(csv_url)
-    if csv_countries:
-        logging.info(f"\nOFAC sanctioned countries found: {', '.join(csv_countries)}")
+    # Flag the countries of the SDN list and store its entities
+    updater.run()
 
-        # Update the database based on the OFAC countries
-        logging.info("Updating the database with new OFAC data...")
-        updater.update_database_OFAC(csv_countries)
+    # Get a summary of countries with 'YES' status
+    yes_countries = updater.get_summary_of_yes_countries()
+    logging.info(f"\nSummary of countries with 'YES' status in OFAC Sanction Program: {', '.join(yes_countries)}")
 
-        # Get a summary of countries with 'YES' status
-        yes_countries = updater.get_summary_of_yes_countries()
-        logging.info(f"\nSummary of countries with 'YES' status in OFAC Sanction Program: {', '.join(yes_countries)}")
-    else:
-        logging.error("No OFAC sanctioned countries found or failed to parse the CSV content.")
+    # Get the countries of every program when reading the advanced XML export
+    if OFAC_MODE == 'xml':
+        for program, countries in updater.get_programs_summary().items():
+            logging.info(f"OFAC program {program}: {', '.join(countries)}")
 
 if __name__ == "__main__":
     main()
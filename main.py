@@ -10,23 +10,30 @@ This script can be run as a cron job or scheduled task to periodically update th
 
 # Import necessary libraries
 import os
+import time
+import argparse
 import datetime
 import logging
-import pyodbc
 import dotenv
+import pyodbc
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from openpyxl import Workbook
 
 # Import parser modules
-from Parser.CPI import main as cpi_main
-from Parser.EUFATF import main as eufatf_main
-from Parser.EUsanctions import main as eusanctions_main
-from Parser.EUtax import main as eutax_main
-from Parser.FATF_CFA import main as fatfcfa_main
-from Parser.FATF_IM import main as fatfim_main
-from Parser.FRsanctions import main as frsanctions_main
-from Parser.FRtax import main as frtax_main
-from Parser.OFAC import main as ofac_main
-from Parser.UKsanctions import main as uksanctions_main
+from Parser.CPI import CPIUpdater
+from Parser.EUFATF import EUFATFUpdater
+from Parser.EUsanctions import EUSanctionsUpdater
+from Parser.EUtax import EUTaxUpdater
+from Parser.FATF_CFA import FATFCFAUpdater
+from Parser.FATF_IM import FATFIMUpdater
+from Parser.FRsanctions import FRSanctionsUpdater
+from Parser.FRtax import FRTaxUpdater
+from Parser.OFAC import OFACUpdater
+from Parser.UKsanctions import UKSanctionsUpdater
+from Logic.ChangePlan import ChangePlan, load_snapshot
+from Logic.SchemaGuard import SchemaGuard
+from Logic.HttpCache import get_http_cache
+from Logic.Database import RunContext
 
 # Load environment variables from .env file
 dotenv.load_dotenv()
@@ -34,6 +41,116 @@ dotenv.load_dotenv()
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Registered updaters, in the order their database writes are applied
+UPDATERS = [
+    CPIUpdater,
+    EUFATFUpdater,
+    EUSanctionsUpdater,
+    EUTaxUpdater,
+    FATFCFAUpdater,
+    FATFIMUpdater,
+    FRSanctionsUpdater,
+    FRTaxUpdater,
+    OFACUpdater,
+    UKSanctionsUpdater,
+]
+
+# Function to parse the command line options
+def parse_args(argv=None):
+    updater_names = [updater_class.source for updater_class in UPDATERS]
+    parser = argparse.ArgumentParser(description="Update the sanctions map from all registered sources.")
+    parser.add_argument('--only', nargs='+', choices=updater_names, metavar='UPDATER',
+                        help=f"Run only these updaters ({', '.join(updater_names)})")
+    parser.add_argument('--skip', nargs='+', choices=updater_names, default=[], metavar='UPDATER',
+                        help="Do not run these updaters")
+    parser.add_argument('--workers', type=int, default=len(UPDATERS),
+                        help="Number of updaters fetching their sources concurrently")
+    parser.add_argument('--force', action='store_true',
+                        help="Parse and plan every source, even those whose documents did not change since the last applied run")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--plan-only', metavar='PLAN_FILE',
+                      help="Fetch, parse and plan the changes, save the plan to PLAN_FILE and leave the database untouched")
+    mode.add_argument('--apply', metavar='PLAN_FILE',
+                      help="Apply a previously saved plan in a single transaction, without fetching any source")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    return args
+
+# Function to select the updaters to run, keeping the registered write order
+def select_updaters(only=None, skip=None):
+    return [updater_class for updater_class in UPDATERS
+            if (not only or updater_class.source in only) and updater_class.source not in (skip or [])]
+
+# Function to run the fetch and parse stages of a single updater
+def run_fetch_stage(updater_class, database, context, force=False):
+    start = time.monotonic()
+    updater = updater_class(database)
+    updater.context = context
+    flags = updater.fetch_and_parse(force)
+    logging.info(f"Fetch and parse stages for {updater.source} completed in {time.monotonic() - start:.1f}s")
+    return updater, flags
+
+# Function to run the fetch and parse stages of every updater concurrently
+def run_fetch_stages(updater_classes, database, context, workers, force=False):
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_fetch_stage, updater_class, database, context, force): updater_class.source for updater_class in updater_classes}
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                fetched[source] = future.result()
+            except Exception as e:
+                logging.error(f"Error during {source} fetch stage: {e}")
+    return fetched
+
+# Function to plan the changes of every fetched updater against the same table snapshot, skipping the unchanged sources.
+# An updater whose plan stage fails is logged and removed from updaters, so that the other sources are still applied.
+def run_plan_stages(updaters, fetched, snapshot):
+    plan = ChangePlan()
+    for updater in list(updaters):
+        _, flags = fetched[updater.source]
+        if flags is None:
+            continue
+        try:
+            plan.extend(updater.plan(flags, snapshot))
+        except Exception as e:
+            logging.error(f"Error during {updater.source} plan stage: {e}")
+            updaters.remove(updater)
+    return plan
+
+# Function to apply the plan one updater at a time, in registration order
+def run_apply_stages(cnx, updaters, plan, single_transaction=False):
+    cursor = cnx.cursor()
+    try:
+        for updater in updaters:
+            source_plan = plan.for_source(updater.source)
+            if not source_plan and not updater.has_pending_writes():
+                logging.info(f"No changes to apply for {updater.source}.")
+                updater.mark_applied()
+                continue
+            start = time.monotonic()
+            try:
+                updater.apply(source_plan, cursor)
+                if not single_transaction:
+                    cnx.commit()
+                    updater.mark_applied()
+                logging.info(f"Apply stage for {updater.source} completed in {time.monotonic() - start:.1f}s")
+            except Exception as e:
+                if single_transaction:
+                    raise
+                cnx.rollback()
+                logging.error(f"Error during {updater.source} apply stage: {e}")
+        if single_transaction:
+            cnx.commit()
+            for updater in updaters:
+                updater.mark_applied()
+    except Exception as e:
+        cnx.rollback()
+        logging.error(f"Error applying the change plan, transaction rolled back: {e}")
+    finally:
+        cursor.close()
+
 # Function to fetch data from a table in the database
 def fetch_table_data(cursor, table_name):
     cursor.execute(f"SELECT * FROM {table_name}")
@@ -41,38 +158,53 @@ def fetch_table_data(cursor, table_name):
     columns = [column[0] for column in cursor.description]
     return rows, columns
 
-# Function to log changes to the audit table
+# Function to compute the cell changes between two states of TblSanctionsMap, rows being matched on SanctionsMapId
+def diff_table_rows(old_rows, new_rows, columns):
+    new_rows_by_id = {row['SanctionsMapId']: row for row in new_rows}
+    changes = []
+    for old_row in old_rows:
+        country_id = old_row['SanctionsMapId']
+        new_row = new_rows_by_id.get(country_id)
+        if new_row is None:
+            logging.warning(f"Row {country_id} of TblSanctionsMap disappeared during the run, not audited.")
+            continue
+        for column in columns:
+            old_value = old_row.get(column)
+            new_value = new_row.get(column)
+            if old_value != new_value:
+                changes.append((country_id, column, old_value, new_value))
+    return changes
+
+# Function to log changes to the audit table, all audit rows being written in one batch
 def log_changes_to_audit_table(cursor, old_rows, new_rows, columns):
     try:
-        changes_detected = False
-
-        for old_row, new_row in zip(old_rows, new_rows):
-            country_id = old_row[columns.index('SanctionsMapId')]
-
-            for i, column in enumerate(columns):
-                old_value = old_row[i]
-                new_value = new_row[i]
-
-                if old_value != new_value:
-                    changes_detected = True
-                    audit_sql = """
-                        INSERT INTO TblSanctionsMap_Audit (
-                            SanctionsMapId, ColumnName, OldValue, NewValue, UpdatedAt
-                        ) VALUES (?, ?, ?, ?, ?)
-                    """
-                    cursor.execute(audit_sql, country_id, column, old_value, new_value, datetime.datetime.now())
-                    logging.info(f"Logged change for ID {country_id} in column {column}: {old_value} -> {new_value}")
-
-        if changes_detected:
-            cursor.connection.commit()
+        changes = diff_table_rows(old_rows, new_rows, columns)
+        updated_at = datetime.datetime.now()
+
+        if changes:
+            audit_rows = [(country_id, column, None if old_value is None else str(old_value),
+                           None if new_value is None else str(new_value), updated_at)
+                          for country_id, column, old_value, new_value in changes]
+            for country_id, column, old_value, new_value in changes:
+                logging.info(f"Logged change for ID {country_id} in column {column}: {old_value} -> {new_value}")
+        else:
+            audit_rows = [(-1, 'None', 'No changes detected', 'No changes detected', updated_at)]
+
+        # Parameter types are given explicitly, as fast_executemany would otherwise size them from the batch;
+        # a size of 0 binds the old and new values as NVARCHAR(MAX)
+        cursor.fast_executemany = True
+        cursor.setinputsizes([(pyodbc.SQL_INTEGER, 0, 0), (pyodbc.SQL_WVARCHAR, 255, 0), (pyodbc.SQL_WVARCHAR, 0, 0),
+                              (pyodbc.SQL_WVARCHAR, 0, 0), (pyodbc.SQL_TYPE_TIMESTAMP, 0, 0)])
+        cursor.executemany("""
+            INSERT INTO TblSanctionsMap_Audit (
+                SanctionsMapId, ColumnName, OldValue, NewValue, UpdatedAt
+            ) VALUES (?, ?, ?, ?, ?)
+        """, audit_rows)
+        cursor.setinputsizes(None)
+        cursor.connection.commit()
+        if changes:
+            logging.info(f"Logged {len(changes)} changes to the audit table.")
         else:
-            audit_sql = """
-                INSERT INTO TblSanctionsMap_Audit (
-                    SanctionsMapId, ColumnName, OldValue, NewValue, UpdatedAt
-                ) VALUES (?, ?, ?, ?, ?)
-            """
-            cursor.execute(audit_sql, -1, 'None', 'No changes detected', 'No changes detected', datetime.datetime.now())
-            cursor.connection.commit()
             logging.info("No changes detected. Logged to audit table.")
     except Exception as e:
         cursor.connection.rollback()
@@ -95,7 +227,9 @@ def export_table_to_excel(cursor, table_name, export_folder):
     except Exception as e:
         logging.error(f"Error exporting {table_name} table to Excel: {e}")
 
-def main():
+def main(argv=None):
+    args = parse_args(argv)
+
     # Database connection parameters
     server = os.getenv('SERVER')
     database = os.getenv('DATABASE')
@@ -116,32 +250,79 @@ def main():
         f'PWD={pwd}'
     )
 
-    cnx = None
+    updater_classes = select_updaters(args.only, args.skip)
+    if not updater_classes:
+        logging.error("No updaters selected.")
+        return
+
+    # Connection pool and table snapshot shared by every updater of the run
+    context = RunContext(conn_str)
     try:
-        cnx = pyodbc.connect(conn_str)
-        cursor = cnx.cursor()
+        if args.apply:
+            # Replay a reviewed plan instead of fetching the sources
+            plan = ChangePlan.load(args.apply)
+            updaters = [updater_class(database) for updater_class in updater_classes]
+            for updater in updaters:
+                updater.context = context
+        else:
+            # Download and parse every source concurrently
+            logging.info(f"Fetching {len(updater_classes)} sources with {args.workers} workers...")
+            fetched = run_fetch_stages(updater_classes, database, context, args.workers, args.force)
+            get_http_cache().flush()
+            updaters = [fetched[updater_class.source][0] for updater_class in updater_classes if updater_class.source in fetched]
 
-        old_rows, columns = fetch_table_data(cursor, "TblSanctionsMap")
+        # State of the table before any write, read once for the whole run
+        snapshot = context.snapshot()
+        columns = list(snapshot[0].keys()) if snapshot else []
 
-        # Call main functions of each updater
-        updaters = [cpi_main, eufatf_main, eusanctions_main, eutax_main, fatfcfa_main, fatfim_main, frsanctions_main, frtax_main, ofac_main, uksanctions_main]
-        for updater_main in updaters:
-            try:
-                updater_main()
-            except Exception as e:
-                logging.error(f"Error during updater execution: {e}")
+        if args.apply:
+            # A saved plan is only replayed if the table still holds the values it was planned from
+            stale_changes = plan.stale_changes(snapshot)
+            if stale_changes:
+                for change in stale_changes:
+                    logging.error(f"Country: {change.country}, Column: {change.column} changed since the plan was saved "
+                                  f"(planned from {change.old_value}).")
+                logging.error(f"{len(stale_changes)} changes of {args.apply} are stale, the plan was not applied.")
+                return
+
+        if not args.apply:
+            # Compare every parsed source with the current table state
+            plan = run_plan_stages(updaters, fetched, snapshot)
+
+        plan.log_summary()
+        if args.plan_only:
+            plan.save(args.plan_only)
+            logging.info("Plan-only run: the database was not modified.")
+            return
+
+        with context.pool.connection() as cnx:
+            cursor = cnx.cursor()
 
-        new_rows, _ = fetch_table_data(cursor, "TblSanctionsMap")
+            # Apply the changes one updater at a time, with the schema changes done once for the whole run
+            # and the risk classification refreshed once every updater has written
+            column_types = {}
+            tables = []
+            for updater in updaters:
+                if updater.source in plan.sources():
+                    column_types.update(updater.column_types())
+                if updater.source in plan.sources() or updater.has_pending_writes():
+                    tables.extend(updater.table_definitions())
+            with SchemaGuard(cnx, column_types, tables):
+                if plan or any(updater.has_pending_writes() for updater in updaters):
+                    run_apply_stages(cnx, updaters, plan, single_transaction=bool(args.apply))
 
-        log_changes_to_audit_table(cursor, old_rows, new_rows, columns)
-        export_table_to_excel(cursor, "TblSanctionsMap_Audit", export_folder)
+            # Audit the snapshot columns, rows being matched on SanctionsMapId whatever their order and the column order
+            new_rows = load_snapshot(cursor)
+            log_changes_to_audit_table(cursor, snapshot, new_rows, columns)
+            export_table_to_excel(cursor, "TblSanctionsMap_Audit", export_folder)
+            cursor.close()
+        get_http_cache().prune()
 
         logging.info("Process completed successfully.")
     except Exception as e:
         logging.error(f"Error during processing: {e}")
     finally:
-        if cnx:
-            cnx.close()
+        context.close()
 
 if __name__ == "__main__":
     main()